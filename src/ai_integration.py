@@ -3,50 +3,160 @@ AI Integration for Terminal Quest: Remastered
 Handles intelligent command analysis using Ollama
 """
 
-import requests
 import json
+import posixpath
+import threading
 import time
+from collections import OrderedDict
 from typing import Tuple, Dict, Any
 
+from ai_scheduler import INTERACTIVE
+from command_kb import DANGEROUS_SUBSTRING_REASON, KNOWLEDGE_BASE, MAX_LEVEL, SHELL_SYNTAX
+from metrics import REGISTRY
+
+ANALYZE_TIME = REGISTRY.histogram("ai_analyze_seconds", "Time to judge a command, from the cache, the model or the fallback rules")
+MODEL_TIME = REGISTRY.histogram("ai_model_seconds", "Time spent on model requests (including retries)")
+CACHE_HITS = REGISTRY.counter("ai_cache_hits_total", "Verdicts answered from the verdict cache")
+CACHE_MISSES = REGISTRY.counter("ai_cache_misses_total", "Verdicts not in the verdict cache")
+FALLBACKS = REGISTRY.counter("ai_fallbacks_total", "Verdicts from the basic rules because the model failed")
+
+
+def _requests():
+    """The requests module, imported on first use (it is slow to import)"""
+    import requests
+    return requests
+
+
 class AICommandAnalyzer:
-    def __init__(self, ollama_endpoint="http://localhost:11434"):
+    def __init__(self, ollama_endpoint="http://localhost:11434", pool_size=10, cache_size=1024, check_connection=True):
         self.ollama_endpoint = ollama_endpoint.rstrip('/')
         self.model = "llama3.2:3b"  # Default model, can be configured
         self.max_retries = 3
         self.timeout = 10
         
-        # Test connection on initialization
-        self.test_connection()
+        # One keep-alive connection pool, shared by every session using this
+        # analyzer; created (and requests imported) on the first request
+        self.pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+        
+        # AI verdicts keyed by command and story context (LRU)
+        self.cache_size = cache_size
+        self.verdict_cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        # Optional AIRequestScheduler; without one, requests go straight out
+        self.scheduler = None
+        
+        # Test connection on initialization (an HTTP request; up to 5s if Ollama is down)
+        if check_connection:
+            self.test_connection()
+    
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    requests = _requests()
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
     
     def test_connection(self):
         """Test if Ollama server is accessible"""
         try:
-            response = requests.get(f"{self.ollama_endpoint}/api/tags", timeout=5)
+            response = self.session.get(f"{self.ollama_endpoint}/api/tags", timeout=5)
             if response.status_code == 200:
                 print("[AI] Connected to Ollama server successfully")
                 return True
-        except requests.exceptions.RequestException:
+        except _requests().exceptions.RequestException:
             print("[AI] Warning: Could not connect to Ollama server")
             print(f"[AI] Make sure Ollama is running at {self.ollama_endpoint}")
             print("[AI] Falling back to basic safety checks only")
             return False
         return False
     
-    def analyze_command(self, command: str, current_dir: str, game_progress: int, story_context: Dict[str, Any]) -> Tuple[bool, str]:
+    @ANALYZE_TIME.time
+    def analyze_command(self, command: str, current_dir: str, game_progress: int, story_context: Dict[str, Any],
+                        session_id=None, priority: int = INTERACTIVE, details: Dict[str, Any] = None) -> Tuple[bool, str]:
         """
         Analyze if a command is safe and appropriate for the current context
         
+        Args:
+            session_id: Which learner is asking, for scheduler fairness
+            priority: ai_scheduler.INTERACTIVE or ai_scheduler.BACKGROUND
+            details: Optional dict; "source" is set to where the verdict came
+                from ("cache", "model" or "fallback")
+        
         Returns:
             Tuple[bool, str]: (is_safe, reasoning)
         """
+        key = self._cache_key(command, current_dir, game_progress, story_context)
+        with self.cache_lock:
+            cached = self.verdict_cache.get(key)
+            if cached is not None:
+                self.verdict_cache.move_to_end(key)
+                self.cache_hits += 1
+                CACHE_HITS.inc()
+                if details is not None:
+                    details["source"] = "cache"
+                return cached
+            self.cache_misses += 1
+        CACHE_MISSES.inc()
+        
+        def ask_model():
+            start = time.perf_counter()
+            try:
+                return self._ai_analyze_command(command, current_dir, game_progress, story_context)
+            finally:
+                MODEL_TIME.observe(time.perf_counter() - start)
+        
         # Try AI analysis first
         try:
-            return self._ai_analyze_command(command, current_dir, game_progress, story_context)
+            if self.scheduler is not None:
+                # Identical requests already in flight are merged by the scheduler
+                verdict = self.scheduler.run(key, ask_model, session_id=session_id, priority=priority)
+            else:
+                verdict = ask_model()
+            self._store_verdict(key, verdict)
+            if details is not None:
+                details["source"] = "model"
+            return verdict
         except Exception as e:
+            FALLBACKS.inc()
+            if details is not None:
+                details["source"] = "fallback"
             print(f"[AI] Error in AI analysis: {e}")
             # Fall back to basic analysis
             return self._basic_analyze_command(command, current_dir, game_progress, story_context)
     
+    def _cache_key(self, command: str, current_dir: str, game_progress: int, story_context: Dict[str, Any]) -> tuple:
+        """Build the verdict cache key from everything the prompt depends on"""
+        return (
+            " ".join(command.split()),
+            current_dir,
+            game_progress,
+            story_context.get('chapter', 1),
+            tuple(story_context.get('commands_learned', [])),
+            story_context.get('lesson_context', 'general'),
+            story_context.get('expecting_command')
+        )
+    
+    def _store_verdict(self, key: tuple, verdict: Tuple[bool, str]):
+        """Remember an AI verdict, evicting the least recently used one"""
+        if not self.cache_size:
+            return
+        with self.cache_lock:
+            self.verdict_cache[key] = verdict
+            self.verdict_cache.move_to_end(key)
+            while len(self.verdict_cache) > self.cache_size:
+                self.verdict_cache.popitem(last=False)
+    
     def _ai_analyze_command(self, command: str, current_dir: str, game_progress: int, story_context: Dict[str, Any]) -> Tuple[bool, str]:
         """AI-powered command analysis using Ollama"""
         
@@ -78,7 +188,7 @@ class AICommandAnalyzer:
         
         for attempt in range(self.max_retries):
             try:
-                response = requests.post(
+                response = self.session.post(
                     f"{self.ollama_endpoint}/api/generate",
                     json=payload,
                     timeout=self.timeout
@@ -91,7 +201,7 @@ class AICommandAnalyzer:
                     # Parse the AI response
                     return self._parse_ai_response(ai_response)
                 
-            except requests.exceptions.RequestException as e:
+            except _requests().exceptions.RequestException as e:
                 if attempt == self.max_retries - 1:
                     raise e
                 time.sleep(1)  # Brief pause before retry
@@ -122,11 +232,7 @@ SAFETY RULES:
 6. ENCOURAGE if they're experimenting appropriately with learned commands
 
 LEARNING PROGRESSION:
-- Level 1: pwd, ls, cd, cat, less
-- Level 2: mkdir, touch, cp, mv, nano
-- Level 3: chmod, find, grep, head, tail
-- Level 4: ps, top, df, free, lspci
-- Level 5: systemctl, journalctl (read-only system commands)
+{self._learning_progression()}
 
 Respond with EXACTLY this format:
 DECISION: SAFE/UNSAFE
@@ -142,6 +248,17 @@ REASON: Whoa there! That command is quite advanced and could modify important sy
         
         return prompt
     
+    def _learning_progression(self) -> str:
+        """The levels from the knowledge base, one line each, so the model and the rules agree"""
+        lines = []
+        for level in range(1, MAX_LEVEL + 1):
+            commands = KNOWLEDGE_BASE.taught_at(level)
+            look_only = [command for command in commands
+                         if command in KNOWLEDGE_BASE.read_only or command in KNOWLEDGE_BASE.read_only_verbs]
+            note = f" ({', '.join(look_only)}: read-only use only)" if look_only else ""
+            lines.append(f"- Level {level}: {', '.join(commands)}{note}")
+        return "\n".join(lines)
+    
     def _parse_ai_response(self, ai_response: str) -> Tuple[bool, str]:
         """Parse the AI response into safety decision and reasoning"""
         lines = ai_response.strip().split('\n')
@@ -167,51 +284,62 @@ REASON: Whoa there! That command is quite advanced and could modify important sy
     def _basic_analyze_command(self, command: str, current_dir: str, game_progress: int, story_context: Dict[str, Any]) -> Tuple[bool, str]:
         """Basic fallback analysis when AI is unavailable"""
         
-        # Basic safe commands for beginners
-        safe_commands = {
-            1: ['pwd', 'ls', 'cd', 'cat', 'less', 'head', 'tail'],
-            2: ['mkdir', 'touch', 'cp', 'mv', 'nano', 'echo'],
-            3: ['find', 'grep', 'sort', 'uniq', 'wc'],
-            4: ['ps', 'top', 'df', 'free', 'lspci', 'lsusb', 'uname'],
-            5: ['systemctl status', 'journalctl', 'dmesg']
-        }
-        
         # Get base command
         base_command = command.split()[0]
         
-        # Check if command is in the allowed list for their level
-        allowed_commands = []
-        for level in range(1, min(game_progress + 1, 6)):
-            allowed_commands.extend(safe_commands.get(level, []))
-        
-        # Special handling for specific commands
-        if base_command in ['systemctl', 'journalctl']:
-            # Only allow read-only operations
-            if any(dangerous in command for dangerous in ['start', 'stop', 'enable', 'disable', 'restart']):
-                return False, "That's a system administration command that could affect running services. Let's stick to learning basics first."
+        # Special handling for specific commands (e.g. systemctl may only look)
+        reason = KNOWLEDGE_BASE.read_only_violation(command)
+        if reason:
+            return False, reason
         
         # Check for obviously dangerous patterns
-        dangerous_patterns = [
-            'rm -rf', 'dd if=', 'mkfs', '> /dev/', 'chmod 777 /', 
-            'chown root', 'sudo rm', 'sudo dd', '://', 'curl', 'wget'
-        ]
-        
-        for pattern in dangerous_patterns:
-            if pattern in command.lower():
-                return False, "That command could potentially harm your system. Let's practice with safer commands first."
+        if KNOWLEDGE_BASE.has_dangerous_substring(command):
+            return False, DANGEROUS_SUBSTRING_REASON
         
         # Check if they're trying to leave the safe directory structure
         if base_command == 'cd':
             target = command.split()[1] if len(command.split()) > 1 else "~"
-            if target.startswith('/') and not target.startswith('/home'):
+            if target.startswith('/'):
+                leaves_home = not target.startswith('/home')
+            elif current_dir.startswith('~') and not target.startswith('~') and target != '-':
+                # Relative to where they are: "cd ../../.." shouldn't climb out of home either
+                destination = posixpath.normpath(posixpath.join(current_dir, target))
+                leaves_home = destination != '~' and not destination.startswith('~/')
+            else:
+                leaves_home = False
+            if leaves_home:
                 return False, "Let's stick to exploring your home directory area for now. System directories can wait until you're more experienced."
         
+        # The command the story is asking for (or it with other flags) is appropriate once it's known to be harmless
+        if self._matches_expected(command, story_context.get('expecting_command')):
+            return True, "That's exactly the command we're working on. Go for it!"
+        
         # If command seems safe and appropriate for their level
-        if base_command in allowed_commands:
+        if KNOWLEDGE_BASE.is_allowed(base_command, game_progress):
             return True, f"Good choice! The '{base_command}' command is perfect for where you are in your learning."
         
+        suggestions = ', '.join(KNOWLEDGE_BASE.suggestions_for(game_progress))
+        if base_command in KNOWLEDGE_BASE.known:
+            # Taught later on: say what it is and that it's coming
+            tutorial = KNOWLEDGE_BASE.tutorial(base_command)
+            what = f" ({tutorial['description'].lower()})" if tutorial and tutorial.get('description') else ""
+            return False, f"'{base_command}'{what} is coming up later in your training. For now, try commands we've learned like: {suggestions}."
+        
         # Unknown command - be cautious but educational
-        return False, f"I'm not familiar with '{base_command}' or it might be too advanced right now. Try using commands we've learned like: {', '.join(allowed_commands[:5])}."
+        return False, f"I'm not familiar with '{base_command}' or it might be too advanced right now. Try using commands we've learned like: {suggestions}."
+    
+    def _matches_expected(self, command: str, expecting: str) -> bool:
+        """The expected command itself, or with different flags ("ls -l" for "ls -la"); never another chain"""
+        if not expecting:
+            return False
+        words, expected = command.split(), expecting.split()
+        if words == expected:
+            return True
+        if words[:1] != expected[:1] or SHELL_SYNTAX.search(command):
+            return False
+        # Same arguments in the same order; only the options may differ
+        return [word for word in words[1:] if not word.startswith('-')] == \
+            [word for word in expected[1:] if not word.startswith('-')]
     
     def update_model(self, model_name: str):
         """Update the AI model being used"""
@@ -221,15 +349,41 @@ REASON: Whoa there! That command is quite advanced and could modify important sy
     def get_available_models(self):
         """Get list of available models from Ollama"""
         try:
-            response = requests.get(f"{self.ollama_endpoint}/api/tags", timeout=5)
+            response = self.session.get(f"{self.ollama_endpoint}/api/tags", timeout=5)
             if response.status_code == 200:
                 data = response.json()
                 return [model['name'] for model in data.get('models', [])]
-        except requests.exceptions.RequestException:
+        except _requests().exceptions.RequestException:
             pass
         return []
 
 
+class MockCommandAnalyzer(AICommandAnalyzer):
+    """
+    Stand-in for the Ollama backend, for load tests and scripted runs
+    Answers with the rule-based analysis after a simulated model latency
+    """
+    
+    def __init__(self, latency=0.0, cache_size=1024):
+        self.latency = latency
+        super().__init__("http://mock-ollama", pool_size=1, cache_size=cache_size)
+    
+    def test_connection(self):
+        """The mock backend is always reachable"""
+        print(f"[AI] Using mock AI backend ({self.latency * 1000:.0f}ms simulated latency)")
+        return True
+    
+    def _ai_analyze_command(self, command: str, current_dir: str, game_progress: int, story_context: Dict[str, Any]) -> Tuple[bool, str]:
+        """Pretend to ask the model, then fall back to the basic rules"""
+        if self.latency:
+            time.sleep(self.latency)
+        return self._basic_analyze_command(command, current_dir, game_progress, story_context)
+    
+    def get_available_models(self):
+        """The mock backend has a single pretend model"""
+        return ["mock"]
+
+
 class ShellAI:
     """
     Optional AI-powered Shell character
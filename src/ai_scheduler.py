@@ -0,0 +1,190 @@
+"""
+AI Request Scheduler for Terminal Quest: Remastered
+Controls how analysis requests reach a shared Ollama backend: a global
+concurrency cap, round-robin fairness between sessions, merging of
+identical in-flight requests and priority for interactive work
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Lower number = served first
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+class _Job:
+    __slots__ = ("key", "func", "session_id", "priority", "enqueued", "future")
+
+    def __init__(self, key, func, session_id, priority):
+        self.key = key
+        self.func = func
+        self.session_id = session_id
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.future = Future()
+
+
+class AIRequestScheduler:
+    def __init__(self, max_concurrency: int = 2, wait_samples: int = 1024):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.condition = threading.Condition()
+
+        # priority -> session id -> queued jobs; sessions are served round-robin
+        self.queues = {priority: OrderedDict() for priority in PRIORITY_NAMES}
+        # key -> job, for everything queued or running
+        self.in_flight = {}
+        self.workers = []
+        self.active = 0
+        self.closed = False
+
+        self.submitted = 0
+        self.completed = 0
+        self.coalesced = 0
+        self.promoted = 0
+        self.recent_waits = deque(maxlen=wait_samples)
+        self.max_wait = 0.0
+
+    def submit(self, key: Hashable, func: Callable[[], Any], session_id: Optional[Hashable] = None,
+               priority: int = INTERACTIVE) -> Future:
+        """
+        Queue a request, or join an identical one that is already queued or running
+
+        Returns:
+            Future: resolves to func()'s result (or exception)
+        """
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("AI request scheduler has been shut down")
+            self._start_workers()
+            self.submitted += 1
+
+            existing = self.in_flight.get(key)
+            if existing is not None:
+                self.coalesced += 1
+                if priority < existing.priority and self._dequeue(existing):
+                    # Someone is now waiting on it interactively: move it up
+                    existing.priority = priority
+                    self._enqueue(existing)
+                    self.promoted += 1
+                return existing.future
+
+            job = _Job(key, func, session_id, priority)
+            self.in_flight[key] = job
+            self._enqueue(job)
+            self.condition.notify()
+            return job.future
+
+    def run(self, key: Hashable, func: Callable[[], Any], session_id: Optional[Hashable] = None,
+            priority: int = INTERACTIVE, timeout: Optional[float] = None) -> Any:
+        """Submit a request and wait for its result"""
+        return self.submit(key, func, session_id, priority).result(timeout)
+
+    def _start_workers(self):
+        """Start the worker threads on first use"""
+        while len(self.workers) < self.max_concurrency:
+            worker = threading.Thread(target=self._worker, name=f"tq-ai-{len(self.workers)}", daemon=True)
+            self.workers.append(worker)
+            worker.start()
+
+    def _enqueue(self, job: _Job):
+        self.queues[job.priority].setdefault(job.session_id, deque()).append(job)
+
+    def _dequeue(self, job: _Job) -> bool:
+        """Remove a job that hasn't started yet; False if it is already running"""
+        sessions = self.queues[job.priority]
+        queue = sessions.get(job.session_id)
+        if not queue or job not in queue:
+            return False
+        queue.remove(job)
+        if not queue:
+            del sessions[job.session_id]
+        return True
+
+    def _next_job(self) -> Optional[_Job]:
+        """Highest priority first; within a priority, one job per session in turn"""
+        for priority in sorted(self.queues):
+            sessions = self.queues[priority]
+            if not sessions:
+                continue
+            session_id, queue = next(iter(sessions.items()))
+            job = queue.popleft()
+            del sessions[session_id]
+            if queue:
+                # Back of the line for this session's next request
+                sessions[session_id] = queue
+            return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                job = self._next_job()
+                while job is None:
+                    if self.closed:
+                        return
+                    self.condition.wait()
+                    job = self._next_job()
+
+                wait = time.monotonic() - job.enqueued
+                self.recent_waits.append(wait)
+                self.max_wait = max(self.max_wait, wait)
+                self.active += 1
+
+            try:
+                result = job.func()
+            except BaseException as e:
+                job.future.set_exception(e)
+            else:
+                job.future.set_result(result)
+            finally:
+                with self.condition:
+                    self.active -= 1
+                    self.completed += 1
+                    if self.in_flight.get(job.key) is job:
+                        del self.in_flight[job.key]
+
+    def reset_stats(self):
+        """Start the counters and wait samples over (e.g. between load-test rounds)"""
+        with self.condition:
+            self.submitted = 0
+            self.completed = 0
+            self.coalesced = 0
+            self.promoted = 0
+            self.recent_waits.clear()
+            self.max_wait = 0.0
+
+    def shutdown(self):
+        """Stop the workers once the queued requests are done; later submits fail"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        for worker in self.workers:
+            if worker is not threading.current_thread():
+                worker.join()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, wait times and coalescing counters"""
+        with self.condition:
+            waits = sorted(self.recent_waits)
+            depth = {
+                PRIORITY_NAMES[priority]: sum(len(queue) for queue in sessions.values())
+                for priority, sessions in self.queues.items()
+            }
+            return {
+                "max_concurrency": self.max_concurrency,
+                "active": self.active,
+                "queue_depth": depth,
+                "queued_sessions": len({sid for sessions in self.queues.values() for sid in sessions}),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "coalesced": self.coalesced,
+                "promoted": self.promoted,
+                "wait_avg": sum(waits) / len(waits) if waits else 0.0,
+                "wait_p95": waits[min(len(waits) - 1, int(0.95 * len(waits)))] if waits else 0.0,
+                "wait_max": self.max_wait
+            }
@@ -0,0 +1,263 @@
+"""
+ASCII Converter for Terminal Quest: Remastered
+Turns component photos into ASCII art for ascii_art.json: the image is
+resized and each pixel's luminance is mapped to a character ramp with
+vectorized NumPy operations
+
+Needs NumPy and Pillow (python3-numpy, python3-pil); the game itself runs
+without them.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    from PIL import Image, ImageOps
+except ImportError:
+    np = None
+    Image = ImageOps = None
+
+from ascii_display import ASCIIDisplay
+from progress import write_atomically
+
+# Sparse to dense; on a dark terminal the densest characters look brightest
+DEFAULT_RAMP = " .:-=+*#%@"
+DEFAULT_WIDTHS = (60,)
+# Terminal cells are about twice as tall as they are wide
+CHAR_ASPECT = 0.5
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp", ".tif", ".tiff"}
+STATE_FILE = ".terminal_quest_ascii.json"
+
+
+def require_imaging():
+    """Fail with install instructions if NumPy/Pillow are missing"""
+    if np is None or Image is None:
+        raise RuntimeError("The ASCII converter needs NumPy and Pillow. "
+                           "Install them with: sudo apt install python3-numpy python3-pil")
+
+
+def check_ramp(ramp: str) -> str:
+    """A character ramp, if it can be used: at least one printable character (Unicode is fine)"""
+    if not ramp:
+        raise ValueError("The ramp needs at least one character")
+    if not ramp.isprintable():
+        raise ValueError(f"The ramp can only hold printable characters, not {ramp!r}")
+    return ramp
+
+
+def ramp_argument(value: str) -> str:
+    """argparse type for --ramp"""
+    try:
+        return check_ramp(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def variant_name(name: str, width: int, widths: Sequence[int]) -> str:
+    """Component name for one conversion width; the first width gets the plain name"""
+    return name if width == widths[0] else f"{name}@{width}"
+
+
+def image_to_ascii(image, width: int, ramp: str = DEFAULT_RAMP, invert: bool = False) -> List[str]:
+    """
+    Convert a PIL image to lines of ASCII art `width` characters wide
+
+    Luminance is contrast-stretched, then every pixel is mapped to its ramp
+    character in one array operation.
+    """
+    require_imaging()
+    check_ramp(ramp)
+    gray = ImageOps.exif_transpose(image).convert("L")
+    height = max(1, round(gray.height / gray.width * width * CHAR_ASPECT))
+    pixels = np.asarray(gray.resize((width, height), Image.LANCZOS), dtype=np.float32)
+
+    low, high = float(pixels.min()), float(pixels.max())
+    if high > low:
+        pixels = (pixels - low) / (high - low)
+    else:
+        pixels = np.zeros_like(pixels)
+    if invert:
+        pixels = 1.0 - pixels
+
+    indices = np.rint(pixels * (len(ramp) - 1)).astype(np.intp)
+    if not ramp.isascii():
+        # Block characters and other Unicode ramps: index an array of characters
+        chars = np.array(list(ramp))[indices]
+        return ["".join(row) for row in chars]
+
+    levels = np.frombuffer(ramp.encode("ascii"), dtype=np.uint8)
+    chars = levels[indices]
+
+    # One newline column, then decode the whole grid at once
+    grid = np.hstack([chars, np.full((height, 1), ord("\n"), dtype=np.uint8)])
+    return grid.tobytes().decode("ascii").rstrip("\n").split("\n")
+
+
+def convert_file(path: Path, widths: Sequence[int], ramp: str = DEFAULT_RAMP,
+                 invert: bool = False) -> Dict[int, List[str]]:
+    """Convert one image at every target width (decoding it only once)"""
+    require_imaging()
+    with Image.open(path) as image:
+        image.load()
+        return {width: image_to_ascii(image, width, ramp, invert) for width in widths}
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _convert_job(job: Tuple[str, Tuple[int, ...], str, bool]) -> Tuple[Dict[int, List[str]], float]:
+    """Worker-process entry point: (art per width, seconds spent converting)"""
+    path, widths, ramp, invert = job
+    start = time.perf_counter()
+    result = convert_file(Path(path), widths, ramp, invert)
+    return result, time.perf_counter() - start
+
+
+class BatchConverter:
+    """Converts a directory of component photos into ascii_art.json entries"""
+
+    def __init__(self, display: ASCIIDisplay, widths: Sequence[int] = DEFAULT_WIDTHS, ramp: str = DEFAULT_RAMP,
+                 invert: bool = False, workers: Optional[int] = None):
+        self.display = display
+        self.widths = tuple(widths)
+        self.ramp = ramp
+        self.invert = invert
+        self.workers = workers or os.cpu_count() or 1
+
+    def _settings(self) -> Dict:
+        return {"widths": list(self.widths), "ramp": self.ramp, "invert": self.invert}
+
+    def _load_state(self, image_dir: Path) -> Dict:
+        try:
+            with open(image_dir / STATE_FILE, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def convert_directory(self, image_dir: Path, force: bool = False, caption: Optional[str] = None) -> Dict:
+        """
+        Convert every image in a directory, skipping ones that haven't changed
+
+        Components are named after the file (cpu.jpg -> "cpu"); extra widths
+        are stored as "cpu@40" etc.
+
+        Returns:
+            dict: converted/skipped names, frames produced and frames per second
+        """
+        require_imaging()
+        image_dir = Path(image_dir)
+        state = self._load_state(image_dir)
+        images = sorted(path for path in image_dir.iterdir() if path.suffix.lower() in IMAGE_SUFFIXES)
+
+        todo, skipped, hashes = [], [], {}
+        existing = set(self.display.get_component_list())
+        for path in images:
+            name = path.stem.lower()
+            hashes[name] = file_hash(path)
+            known = state.get(name, {})
+            up_to_date = (known.get("sha256") == hashes[name] and known.get("settings") == self._settings()
+                          and all(variant_name(name, width, self.widths) in existing for width in self.widths))
+            if up_to_date and not force:
+                skipped.append(name)
+            else:
+                todo.append((name, path))
+
+        start = time.perf_counter()
+        jobs = [(str(path), self.widths, self.ramp, self.invert) for _, path in todo]
+        if self.workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(jobs))) as pool:
+                results = list(pool.map(_convert_job, jobs))
+        else:
+            results = [_convert_job(job) for job in jobs]
+        elapsed = time.perf_counter() - start
+
+        # Every new component lands in one atomic write of ascii_art.json
+        with self.display.batch():
+            for (name, _), (art_by_width, _) in zip(todo, results):
+                for width, lines in art_by_width.items():
+                    component_name = variant_name(name, width, self.widths)
+                    current = self.display.ascii_art.get(component_name, {})
+                    text = caption or current.get("caption") or f"This is your {name.replace('_', ' ')}!"
+                    self.display.add_component(component_name, lines, text)
+                state[name] = {"sha256": hashes[name], "settings": self._settings()}
+
+        if todo:
+            write_atomically(image_dir / STATE_FILE, json.dumps(state, indent=2).encode())
+
+        frames = len(todo) * len(self.widths)
+        return {
+            "converted": [name for name, _ in todo],
+            "skipped": skipped,
+            "frames": frames,
+            "seconds": elapsed,
+            "fps": frames / elapsed if elapsed > 0 else 0.0,
+            "workers": min(self.workers, len(jobs)) if jobs else 0
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert component photos into ASCII art for Terminal Quest')
+    parser.add_argument('source', type=Path, help='An image file, or a directory of component photos')
+    parser.add_argument('--name', help='Component name for a single image (default: the file name)')
+    parser.add_argument('--caption', help='Caption for new components (existing captions are kept)')
+    parser.add_argument('--widths', default=','.join(map(str, DEFAULT_WIDTHS)),
+                        help='Comma-separated target widths; the first is the main component')
+    parser.add_argument('--ramp', type=ramp_argument, default=DEFAULT_RAMP,
+                        help='Characters from sparse to dense (Unicode such as " ░▒▓█" works too)')
+    parser.add_argument('--invert', action='store_true', help='Dense characters for dark pixels (light terminals)')
+    parser.add_argument('--workers', type=int, help='Parallel conversions (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Convert even if the image has not changed')
+    parser.add_argument('--preview', action='store_true', help='Print the art instead of saving it')
+    parser.add_argument('--compact', action='store_true',
+                        help='Save ascii_art.json compactly (smaller and faster to load than pretty-printed)')
+    args = parser.parse_args()
+
+    widths = [int(value) for value in args.widths.split(',') if value.strip()]
+    try:
+        require_imaging()
+        display = ASCIIDisplay(Path(__file__).parent, compact=args.compact)
+
+        if args.source.is_dir():
+            converter = BatchConverter(display, widths, args.ramp, args.invert, args.workers)
+            report = converter.convert_directory(args.source, force=args.force, caption=args.caption)
+            print(f"[ASCII] Converted {len(report['converted'])} image(s), skipped {len(report['skipped'])} unchanged")
+            if report["frames"]:
+                print(f"[ASCII] {report['frames']} frames in {report['seconds']:.2f}s "
+                      f"({report['fps']:.1f} frames/sec, {report['workers']} worker(s))")
+            return
+
+        start = time.perf_counter()
+        art_by_width = convert_file(args.source, widths, args.ramp, args.invert)
+        elapsed = time.perf_counter() - start
+        name = args.name or args.source.stem.lower()
+        with display.batch():
+            for width, lines in art_by_width.items():
+                component_name = variant_name(name, width, widths)
+                if args.preview:
+                    print("\n".join(lines))
+                    continue
+                current = display.ascii_art.get(component_name, {})
+                caption = args.caption or current.get("caption") or f"This is your {name}!"
+                display.add_component(component_name, lines, caption)
+                print(f"[ASCII] Saved component '{component_name}' ({width} columns, {len(lines)} lines)")
+        print(f"[ASCII] {len(widths)} frames in {elapsed:.3f}s ({len(widths) / elapsed if elapsed else 0:.1f} frames/sec)")
+    except (RuntimeError, OSError, ValueError) as e:
+        print(f"[ASCII] {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
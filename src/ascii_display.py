@@ -4,29 +4,69 @@ Handles loading and displaying ASCII art for computer components
 """
 
 import json
-import os
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Dict, Optional
 
+from content_bundle import invalidate, load_content
+from pacing import Pacing
+from progress import write_atomically
+from renderer import Renderer
+
 class ASCIIDisplay:
-    def __init__(self, game_dir: Path):
+    def __init__(self, game_dir: Path, pacing: Optional[Pacing] = None, renderer: Optional[Renderer] = None,
+                 compact: bool = False):
+        """
+        Args:
+            compact: Save ascii_art.json without indentation or \\u escapes
+                (a fraction of the size, and quicker to parse)
+        """
         self.game_dir = Path(game_dir)
+        self.pacing = pacing or Pacing()
+        self.renderer = renderer or Renderer()
         self.ascii_file = self.game_dir / "ascii_art.json"
-        self.ascii_art = {}
-        
-        # Load ASCII art
-        self.load_ascii_art()
+        self.compact = compact
+        # Open batch() blocks, and whether a save was deferred inside them
+        self._batch_depth = 0
+        self._batch_dirty = False
+        # Loaded on first use: story sections bring their own art along
+        self._ascii_art = None
+        # Each component's art pre-joined into one string
+        self._frames = {}
+    
+    @property
+    def ascii_art(self) -> Dict:
+        if self._ascii_art is None:
+            self.load_ascii_art()
+        return self._ascii_art
+    
+    @ascii_art.setter
+    def ascii_art(self, value: Dict):
+        self._ascii_art = value
+    
+    @property
+    def frames(self) -> Dict[str, str]:
+        if self._ascii_art is None:
+            self.load_ascii_art()
+        return self._frames
+    
+    @frames.setter
+    def frames(self, value: Dict[str, str]):
+        self._frames = value
     
     def load_ascii_art(self):
-        """Load ASCII art from JSON file"""
-        try:
-            with open(self.ascii_file, 'r') as f:
-                self.ascii_art = json.load(f)
-        except FileNotFoundError:
+        """Load ASCII art from the shared content bundle"""
+        content = load_content(self.game_dir)
+        if content.art is None:
             print(f"Warning: ASCII art file not found at {self.ascii_file}")
             print("Creating placeholder ASCII art file...")
             self.create_placeholder_ascii()
             self.save_ascii_art()
+            return
+        
+        # Our own top-level dicts, so edits here never touch the cached bundle
+        self.ascii_art = dict(content.art)
+        self.frames = dict(content.frames)
     
     def create_placeholder_ascii(self):
         """Create placeholder ASCII art for all components"""
@@ -147,30 +187,83 @@ class ASCIIDisplay:
         }
     
     def save_ascii_art(self):
-        """Save ASCII art to JSON file"""
-        with open(self.ascii_file, 'w') as f:
-            json.dump(self.ascii_art, f, indent=2)
+        """Save ASCII art to JSON file (deferred to the end of an open batch)"""
+        if self._batch_depth:
+            self._batch_dirty = True
+            return
+        self._write_ascii_art()
+    
+    def _write_ascii_art(self):
+        if self.compact:
+            data = json.dumps(self.ascii_art, ensure_ascii=False, separators=(",", ":"))
+        else:
+            data = json.dumps(self.ascii_art, indent=2)
+        # Temp file + rename: a crash leaves the old file, never half of the new one
+        write_atomically(self.ascii_file, data.encode("utf-8"))
+        
+        self.frames = {name: "\n".join(component["art"]) for name, component in self.ascii_art.items()}
+        # The bundle rebuilds itself from the new file on next load
+        invalidate(self.game_dir)
+    
+    @contextmanager
+    def batch(self, compact: Optional[bool] = None):
+        """
+        Group edits so ascii_art.json is written once, when the block ends
+        
+        If the block raises, its edits are rolled back and nothing is written.
+        Batches nest; only the outermost one saves.
+        
+        Args:
+            compact: Override self.compact for this save
+        """
+        outermost = self._batch_depth == 0
+        if outermost:
+            # Components are replaced, never mutated, so a shallow copy is a full snapshot
+            before = (dict(self.ascii_art), dict(self.frames))
+            self._batch_dirty = False
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if outermost:
+                self.ascii_art, self.frames = before
+                self._batch_dirty = False
+            raise
+        
+        self._batch_depth -= 1
+        if outermost and self._batch_dirty:
+            self._batch_dirty = False
+            previous = self.compact
+            if compact is not None:
+                self.compact = compact
+            try:
+                self._write_ascii_art()
+            finally:
+                self.compact = previous
     
     def show_component(self, component_name: str, clear_before: bool = False, press_key_after: bool = True):
         """Display ASCII art for a specific component"""
-        if clear_before:
-            os.system('clear')
-        
         if component_name not in self.ascii_art:
+            if clear_before:
+                self.renderer.clear()
             print(f"[ASCII] Component '{component_name}' not found in ASCII art database")
             return
         
         component = self.ascii_art[component_name]
-        
-        # Display the ASCII art
-        print()
-        for line in component["art"]:
-            print(line)
-        print()
-        
-        # Display the caption
+        frame = self.frames.get(component_name)
+        if frame is None:
+            frame = "\n".join(component["art"])
+        self.show_art(component, frame, press_key_after, clear_before)
+    
+    def show_art(self, component: Dict, frame: str, press_key_after: bool = True, clear_before: bool = False):
+        """Display a component whose art has already been joined into one frame"""
+        # Laid out for the current terminal width (cached per frame and width)
+        text = f"\n{self.renderer.layout_art(frame)}\n"
         if "caption" in component:
-            print(f"[SHELL] {component['caption']}")
+            text += "\n" + self.renderer.layout_text(f"[SHELL] {component['caption']}")
+        # Art and caption go out as one write
+        self.renderer.show(text, clear=clear_before)
         
         if press_key_after:
             self.press_any_key()
@@ -178,19 +271,24 @@ class ASCIIDisplay:
     def show_multiple_components(self, component_names: list, clear_between: bool = True):
         """Display multiple components in sequence"""
         for i, component_name in enumerate(component_names):
-            if clear_between and i > 0:
-                os.system('clear')
+            if not (clear_between and i > 0) or component_name not in self.ascii_art:
+                self.show_component(component_name, clear_before=False, press_key_after=True)
+                continue
             
-            self.show_component(component_name, clear_before=False, press_key_after=True)
+            # Redraw in place: only the rows that differ from the last component are written
+            component = self.ascii_art[component_name]
+            frame = self.frames.get(component_name) or "\n".join(component["art"])
+            lines = ["", *self.renderer.layout_art(frame).split("\n"), ""]
+            if "caption" in component:
+                lines.extend(self.renderer.layout_text(f"[SHELL] {component['caption']}").split("\n"))
+            self.renderer.draw_screen(lines)
+            self.press_any_key()
+        
+        self.renderer.invalidate()
     
     def press_any_key(self, message="Press any key to continue..."):
         """Wait for user input before proceeding"""
-        print(f"\n{message}")
-        try:
-            input()
-        except KeyboardInterrupt:
-            return False
-        return True
+        return self.pacing.wait_for_key(message)
     
     def get_component_list(self) -> list:
         """Get list of available components"""
@@ -202,15 +300,21 @@ class ASCIIDisplay:
             "art": art_lines,
             "caption": caption
         }
+        # Re-joined on demand until the save rebuilds every frame
+        self.frames.pop(name, None)
         self.save_ascii_art()
     
     def update_component(self, name: str, art_lines: list = None, caption: str = None):
         """Update an existing component"""
         if name in self.ascii_art:
+            # Replace rather than mutate: the old dict may be shared with the bundle
+            component = dict(self.ascii_art[name])
             if art_lines is not None:
-                self.ascii_art[name]["art"] = art_lines
+                component["art"] = art_lines
             if caption is not None:
-                self.ascii_art[name]["caption"] = caption
+                component["caption"] = caption
+            self.ascii_art[name] = component
+            self.frames.pop(name, None)
             self.save_ascii_art()
             print(f"[ASCII] Updated component: {name}")
         else:
@@ -257,11 +361,11 @@ class ASCIIDisplay:
 ║  To add your custom ASCII art:                                   ║
 ║                                                                  ║
 ║  1. Take photos of each computer component                       ║
-║  2. Use an online JPEG to ASCII converter                        ║
-║  3. Recommended size: ~60 characters wide, ~15-20 lines tall     ║
-║  4. Edit the ascii_art.json file                                 ║
-║  5. Replace the placeholder art arrays with your converted ASCII ║
-║  6. Update captions to match your specific components            ║
+║  2. Name each photo after its component (cpu.jpg, ram.jpg, ...)  ║
+║  3. Put them in one folder and run the built-in converter:       ║
+║       python3 ascii_converter.py photos/ --widths 60,40          ║
+║  4. Re-run it after retaking photos; unchanged ones are skipped  ║
+║  5. Update captions in ascii_art.json to match your components   ║
 ║                                                                  ║
 ║  Components to photograph:                                       ║
 ║  - CPU (Intel Core i7 3rd gen)                                  ║
@@ -277,7 +381,7 @@ class ASCIIDisplay:
 For best results with ASCII conversion:
 - Use good lighting and clear photos
 - Crop images to focus on the component
-- Try different ASCII conversion settings for clarity
+- Try --invert on light terminals, or a custom --ramp for clarity
 - Test how the ASCII looks in your terminal
 
 The current placeholders show you the exact format needed.
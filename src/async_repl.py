@@ -0,0 +1,553 @@
+"""
+Async REPL for Terminal Quest: Remastered
+Event-loop version of the game loop where analysis, safety checks and
+execution run as tasks instead of one blocking step after another
+"""
+
+import asyncio
+import functools
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_scheduler import BACKGROUND, INTERACTIVE
+from event_log import elapsed_ms
+from metrics import REGISTRY
+from path_index import PATH_INDEX
+from sandbox import SANDBOX_NAME
+
+# The same metrics TerminalQuest.execute_command records
+COMMAND_TIME = REGISTRY.histogram("command_seconds")
+COMMANDS = REGISTRY.counter("commands_total")
+AI_BLOCKS = REGISTRY.counter("commands_blocked_ai_total")
+SAFETY_BLOCKS = REGISTRY.counter("commands_blocked_safety_total")
+UNKNOWN_COMMANDS = REGISTRY.counter("commands_unknown_total")
+
+
+class StoryOutput:
+    """
+    sys.stdout while the REPL runs: writes from a bound thread (the story's)
+    go through the output queue a whole line at a time, everything else
+    straight to the terminal
+    """
+
+    def __init__(self, repl, default):
+        self.repl = repl
+        self.default = default
+        self._local = threading.local()
+
+    def bind(self):
+        self._local.pending = ""
+
+    def unbind(self):
+        self._send(self._local.pending)
+        self._local.pending = None
+
+    def _send(self, text):
+        if not text:
+            return
+        try:
+            self.repl.loop.call_soon_threadsafe(self.repl.output_queue.put_nowait, text)
+        except RuntimeError:
+            # The loop has closed (the learner left mid-story)
+            self.default.write(text)
+
+    def write(self, text):
+        pending = getattr(self._local, "pending", None)
+        if pending is None:
+            return self.default.write(text)
+        # print() writes the text and its newline separately; keep them together
+        lines, newline, rest = (pending + text).rpartition("\n")
+        self._send(lines + newline)
+        self._local.pending = rest
+        return len(text)
+
+    def flush(self):
+        if getattr(self._local, "pending", None) is None:
+            self.default.flush()
+        else:
+            self._send(self._local.pending)
+            self._local.pending = ""
+
+    def __getattr__(self, name):
+        return getattr(self.default, name)
+
+
+class AsyncREPL:
+    def __init__(self, game):
+        self.game = game
+        # Analysis and story code is blocking, so it runs on worker threads
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tq-async")
+        self.loop = None
+        self.output_queue = None
+        self.story_output = None
+        # The prompt a pending read_input showed (None: no read pending)
+        self.prompt = None
+        # The story's reaction to the last command, and its pending key wait
+        self.story_task = None
+        self.key_answer = None
+        self.key_wanted = None
+        self.current_task = None
+        self.speculative_key = None
+        self.speculative_task = None
+        self.stats = {"speculative_hits": 0, "speculative_misses": 0, "cancelled": 0}
+
+    # ------------------------------------------------------------------
+    # Output and input
+    # ------------------------------------------------------------------
+
+    async def _writer(self):
+        """Drain queued output so printing never holds up the loop"""
+        while True:
+            text = await self.output_queue.get()
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            self.output_queue.task_done()
+
+    def say(self, text=""):
+        """Queue a line of output"""
+        self.output_queue.put_nowait(f"{text}\n")
+
+    async def flush(self):
+        """Wait until all queued output has been written"""
+        await self.output_queue.join()
+
+    async def read_input(self, prompt):
+        """Read a line on a daemon thread so the event loop stays free"""
+        await self.flush()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(value, error):
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+
+        def reader():
+            try:
+                value = input(prompt)
+            except (EOFError, KeyboardInterrupt) as e:
+                loop.call_soon_threadsafe(resolve, None, e)
+            else:
+                loop.call_soon_threadsafe(resolve, value, None)
+
+        # A daemon thread (rather than the executor) so a pending read never
+        # keeps the process alive after the learner exits
+        threading.Thread(target=reader, name="tq-input", daemon=True).start()
+        self.prompt = prompt
+        try:
+            return await future
+        finally:
+            self.prompt = None
+
+    async def in_thread(self, func, *args, **kwargs):
+        """Run blocking game code on the worker pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def _on_interrupt(self):
+        """Ctrl+C cancels the running command, otherwise just reminds about 'exit'"""
+        if self.current_task is not None and not self.current_task.done():
+            self.current_task.cancel()
+            self.stats["cancelled"] += 1
+        elif self.key_answer is not None:
+            # The story's key wait sees it as Ctrl+C, as it would at input()
+            self._answer_key(None)
+        else:
+            self.say("\n[SHELL] Use 'exit' to leave safely!")
+
+    # ------------------------------------------------------------------
+    # Command pipeline
+    # ------------------------------------------------------------------
+
+    def _start_analysis(self, command, current_dir, priority=INTERACTIVE, details=None, level=None):
+        """Start the AI analysis for a command as a task"""
+        return asyncio.ensure_future(self.in_thread(
+            self.game.ai_analyzer.analyze_command,
+            command,
+            self.game.display_path(current_dir),
+            self.game.game_progress if level is None else level,
+            self.game.story_manager.get_current_context(),
+            session_id=self.game.session_id,
+            priority=priority,
+            details=details
+        ))
+
+    def _speculate(self, current_dir):
+        """Analyze the command the story is waiting for while the learner types"""
+        expecting = self.game.story_manager.get_current_context().get('expecting_command')
+        key = (expecting, str(current_dir))
+        if not expecting or key == self.speculative_key or not self.game.policies["tutorial"].uses_ai:
+            return
+
+        self._drop_speculation()
+        self.speculative_key = key
+        # Low priority so it never delays a command someone actually typed
+        self.speculative_task = self._start_analysis(expecting, current_dir, priority=BACKGROUND)
+
+    def _drop_speculation(self):
+        """Forget any speculative analysis"""
+        if self.speculative_task is not None and not self.speculative_task.done():
+            self.speculative_task.cancel()
+        self.speculative_key = None
+        self.speculative_task = None
+
+    async def analyze(self, command, current_dir, policy, event=None):
+        """
+        Run the policy's checks (the AI analysis and the safety rules) concurrently
+
+        Args:
+            policy: PolicyProfile deciding which checks run
+            event: Optional event log record to fill in with verdicts and timings
+
+        Returns:
+            bool: True if the command may run
+        """
+        event = {} if event is None else event
+        if self.speculative_task is not None:
+            if (command, str(current_dir)) == self.speculative_key:
+                # The analyzer merges this with the speculative request still in
+                # flight (promoting it), or answers from its verdict cache
+                self.stats["speculative_hits"] += 1
+                self.speculative_key = None
+                self.speculative_task = None
+            else:
+                self.stats["speculative_misses"] += 1
+                self._drop_speculation()
+        start = time.perf_counter()
+        try:
+            return await self._check(command, current_dir, policy, event, start)
+        finally:
+            policy.decision_time.observe(time.perf_counter() - start)
+
+    async def _check(self, command, current_dir, policy, event, start):
+        if "known" in policy.checks:
+            # An index lookup: settled before any analysis is started
+            unknown = PATH_INDEX.unknown_commands(command, str(current_dir))
+            if unknown:
+                UNKNOWN_COMMANDS.inc()
+                event["blocked"] = "unknown"
+                await self.flush()
+                self.game.report_unknown_command(unknown[0])
+                return False
+
+        details = {}
+        ai_task = None
+        if policy.wants_ai(command):
+            ai_task = self._start_analysis(command, current_dir, details=details,
+                                           level=policy.level_for(self.game.game_progress))
+        else:
+            event.update(ai_safe=True, ai_source="policy")
+
+        if "rules" in policy.checks:
+            # The rule check is quick and decisive, so don't wait on the AI if it fails
+            rules_safe = await self.in_thread(self.game.safety_system.is_command_safe, command, str(current_dir))
+            event["safety_ms"] = elapsed_ms(start)
+            if not rules_safe:
+                if ai_task is not None:
+                    ai_task.cancel()
+                SAFETY_BLOCKS.inc()
+                event["blocked"] = "safety"
+                await self.flush()
+                self.game.report_danger(command, safe_mode=policy.relaxed)
+                return False
+
+        if ai_task is None:
+            return True
+        is_safe, reasoning = await ai_task
+        # Both ran at once, so these overlap
+        event.update(ai_safe=is_safe, ai_source=details.get("source"), analysis_ms=elapsed_ms(start))
+        if not is_safe:
+            AI_BLOCKS.inc()
+            event["blocked"] = "ai"
+            await self.flush()
+            self.game.report_ai_block(reasoning)
+            return False
+
+        return True
+
+    async def execute(self, command, current_dir, safe_mode=False):
+        """Analyze and run one command; mirrors TerminalQuest.execute_command"""
+        COMMANDS.inc()
+        start = time.perf_counter()
+        try:
+            return await self._execute(command, current_dir, safe_mode)
+        finally:
+            COMMAND_TIME.observe(time.perf_counter() - start)
+
+    async def _execute(self, command, current_dir, safe_mode):
+        policy = self.game.policies["safe_mode" if safe_mode else "tutorial"]
+        event = self.game.new_command_event(command)
+        event["policy"] = policy.name
+        if not await self.analyze(command, current_dir, policy, event=event):
+            return None, current_dir
+
+        start = time.perf_counter()
+        try:
+            if command.strip().startswith('cd '):
+                return self.game.change_directory(command, current_dir)
+
+            self.current_task = asyncio.ensure_future(
+                self.game.resource_limiter.run_async(
+                    command, str(current_dir),
+                    on_output=self.game.story_manager.begin_output_watch(),
+                    env=self.game.command_env
+                )
+            )
+            output, self.game.last_resource_report = await self.current_task
+            event["returncode"] = self.game.last_resource_report["returncode"]
+            event["timed_out"] = self.game.last_resource_report["timed_out"]
+            return output, current_dir
+
+        except asyncio.CancelledError:
+            event["cancelled"] = True
+            return "^C", current_dir
+        except Exception as e:
+            event["error"] = str(e)
+            return f"Error executing command: {str(e)}", current_dir
+        finally:
+            event["execution_ms"] = elapsed_ms(start)
+            self.current_task = None
+
+    # ------------------------------------------------------------------
+    # Story
+    # ------------------------------------------------------------------
+
+    async def _react(self, command, output, current_dir):
+        """
+        Let the story react to a command while the prompt stays live
+
+        It runs on a worker thread; its text goes through the output queue
+        and its key waits take the learner's next line (see _story_takes).
+        The command's event is logged once the story is done with it.
+        """
+        try:
+            await self.in_thread(self._check_story, command, output)
+        finally:
+            self.game.log_command_event()
+        if self.prompt == "":
+            # The learner has been typing at no prompt while the story printed
+            self.output_queue.put_nowait(f"[{self.game.display_path(current_dir)}]$ ")
+        self._speculate(current_dir)
+
+    def _check_story(self, command, output):
+        """TerminalQuest.check_story, on the story's worker thread"""
+        self.story_output.bind()
+        self.game.pacing.read_keys_with(self._read_key)
+        try:
+            self.game.check_story(command, output)
+        finally:
+            self.game.pacing.read_keys_with(None)
+            self.story_output.unbind()
+
+    def _read_key(self):
+        """The story's key waits (on its worker thread): wait for the learner's next line"""
+        line = asyncio.run_coroutine_threadsafe(self._next_line_for_story(), self.loop).result()
+        if line is None:
+            raise KeyboardInterrupt
+        return line
+
+    async def _next_line_for_story(self):
+        answer = self.key_answer = self.loop.create_future()
+        self.key_wanted.set()
+        return await answer
+
+    def _answer_key(self, line):
+        """Answer the story's pending key wait, if any (None: Ctrl+C)"""
+        answer, self.key_answer = self.key_answer, None
+        self.key_wanted.clear()
+        if answer is not None and not answer.done():
+            answer.set_result(line)
+
+    async def _story_takes(self, line):
+        """
+        Whether a line the learner typed answers the story's key wait
+
+        Typed while the story is still running, a line goes to its next key
+        wait, as it would in the blocking loop; once the story is done, the
+        line is a command, checked against the story's new position.
+        """
+        task = self.story_task
+        if task is None:
+            return False
+        if await self._story_waiting():
+            self._answer_key(line)
+            return True
+        self.story_task = None
+        await task
+        return False
+
+    async def _story_waiting(self):
+        """Wait until the story finishes or waits for a key; True if it's waiting"""
+        if not self.story_task.done():
+            wanted = asyncio.ensure_future(self.key_wanted.wait())
+            await asyncio.wait({self.story_task, wanted}, return_when=asyncio.FIRST_COMPLETED)
+            wanted.cancel()
+        return self.key_answer is not None
+
+    async def _finish_story(self):
+        """Let the story finish before the learner leaves (its key waits see Ctrl+C)"""
+        if self.story_task is None:
+            return
+        while await self._story_waiting():
+            self._answer_key(None)
+        task, self.story_task = self.story_task, None
+        await task
+
+    # ------------------------------------------------------------------
+    # Loops
+    # ------------------------------------------------------------------
+
+    async def _run(self, safe_mode):
+        self.loop = asyncio.get_running_loop()
+        self.output_queue = asyncio.Queue()
+        self.key_wanted = asyncio.Event()
+        self.story_output = StoryOutput(self, sys.stdout)
+        sys.stdout = self.story_output
+        writer = asyncio.ensure_future(self._writer())
+        self.loop.add_signal_handler(signal.SIGINT, self._on_interrupt)
+
+        try:
+            if safe_mode:
+                await self._safe_loop()
+            else:
+                await self._game_loop()
+        finally:
+            self.loop.remove_signal_handler(signal.SIGINT)
+            self._drop_speculation()
+            self._answer_key(None)
+            await self.flush()
+            writer.cancel()
+            sys.stdout = self.story_output.default
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _game_loop(self):
+        """Async counterpart of TerminalQuest.game_loop"""
+        current_dir = await self.in_thread(self.game.setup_game_environment)
+        await self.in_thread(self.game.begin_story)
+        self.game.startup.mark("first_prompt")
+
+        while True:
+            relative_path = self.game.display_path(current_dir)
+            prompt = f"[{relative_path}]$ "
+            if self.story_task is not None and not self.story_task.done():
+                # Typing stays live while the story prints; _react shows the
+                # prompt when it's done (and speculates on its new position)
+                prompt = ""
+            else:
+                self._speculate(current_dir)
+
+            try:
+                user_input = (await self.read_input(prompt)).strip()
+            except EOFError:
+                await self._finish_story()
+                await self.flush()
+                self.game.handle_exit()
+
+            if await self._story_takes(user_input):
+                continue
+
+            if user_input.lower() == 'exit':
+                confirm = await self.read_input("Are you sure you want to exit the tutorial? (y/N): ")
+                if confirm.lower() in ['y', 'yes']:
+                    self.game.handle_exit()
+                continue
+
+            if user_input.lower() == 'reset-tutorial':
+                await self.in_thread(self.game.handle_tutorial_reset)
+                continue
+
+            if user_input.lower() == 'reset-sandbox':
+                await self.in_thread(self.game.handle_sandbox_reset)
+                continue
+
+            if user_input.lower() == 'resources':
+                await self.flush()
+                self.game.show_resource_usage()
+                continue
+
+            if user_input.startswith('__'):
+                await self.flush()
+                if self.game.handle_maintenance_command(user_input):
+                    continue
+
+            if not user_input:
+                continue
+
+            output, current_dir = await self.execute(user_input, current_dir)
+
+            if output is None:
+                self.game.log_command_event()
+                continue
+            if output.strip():
+                self.say(output.rstrip('\n'))
+            self.story_task = asyncio.ensure_future(self._react(user_input, output, current_dir))
+
+    async def _safe_loop(self):
+        """Async counterpart of TerminalQuest.safe_terminal_mode"""
+        current_dir = self.game.home_dir / SANDBOX_NAME
+        current_dir.mkdir(exist_ok=True)
+
+        self.say("\n[SHELL] Welcome back to Terminal Quest!")
+        self.say("[SHELL] You're now in Safe Terminal Mode - you've earned this!")
+        self.say("[SHELL] I'm still here to help, but you have more freedom now.")
+        self.say("[SHELL] Remember: you can always use 'reset-tutorial' to start over.")
+        self.say()
+        self.game.startup.mark("first_prompt")
+
+        while True:
+            relative_path = self.game.display_path(current_dir)
+
+            try:
+                user_input = (await self.read_input(f"[SAFE:{relative_path}]$ ")).strip()
+            except EOFError:
+                break
+
+            if user_input.lower() == 'exit':
+                self.say("\n[SHELL] See you later! Keep practicing those commands!")
+                break
+
+            if user_input.lower() == 'reset-tutorial':
+                await self.in_thread(self.game.handle_tutorial_reset)
+                continue
+
+            if user_input.lower() == 'reset-sandbox':
+                await self.in_thread(self.game.handle_sandbox_reset)
+                continue
+
+            if user_input.lower() == 'help':
+                await self.flush()
+                self.game.show_safe_mode_help()
+                continue
+
+            if user_input.lower() == 'resources':
+                await self.flush()
+                self.game.show_resource_usage()
+                continue
+
+            if user_input.startswith('__'):
+                await self.flush()
+                if self.game.handle_maintenance_command(user_input):
+                    continue
+
+            if not user_input:
+                continue
+
+            output, current_dir = await self.execute(user_input, current_dir, safe_mode=True)
+
+            if output is not None and output.strip():
+                self.say(output.rstrip('\n'))
+            self.game.log_command_event()
+
+    def run_game(self):
+        """Run the tutorial on the event loop"""
+        asyncio.run(self._run(safe_mode=False))
+
+    def run_safe_mode(self):
+        """Run safe terminal mode on the event loop"""
+        asyncio.run(self._run(safe_mode=True))
@@ -0,0 +1,273 @@
+"""
+Command Knowledge Base for Terminal Quest: Remastered
+Everything the game knows about commands in one place: the level each one
+is taught at, why some are dangerous, what to suggest instead, and what the
+story's tutorials say about them. Built once into frozen lookup tables that
+the AI fallback rules, safety system and story manager all query.
+"""
+
+import re
+import threading
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Mapping, Optional, Tuple
+
+GAME_DIR = Path(__file__).parent
+MAX_LEVEL = 5
+
+# The level (1=beginner, 5=advanced, as in the AI prompt) each command is
+# taught at, in the order it is taught
+COMMAND_LEVELS = {
+    1: ('pwd', 'ls', 'cd', 'cat', 'less', 'more', 'head', 'tail', 'clear',
+        'man', 'help', 'info', 'which', 'type', 'apropos', 'whoami'),
+    2: ('mkdir', 'touch', 'cp', 'mv', 'nano', 'echo', 'tree', 'file', 'stat'),
+    3: ('find', 'grep', 'sort', 'uniq', 'wc', 'du', 'date', 'cal'),
+    4: ('ps', 'top', 'htop', 'df', 'free', 'uptime', 'uname', 'id', 'groups', 'lscpu',
+        'lsmem', 'lsblk', 'lspci', 'lsusb', 'lsmod'),
+    5: ('chmod', 'chown', 'systemctl', 'journalctl', 'dmesg')
+}
+
+# Commands allowed only for looking, never for changing the system: the
+# verbs that only look (the first word after the options; none at all lists
+# units) or, for commands without verbs, the options that change something
+READ_ONLY_VERBS = {
+    'systemctl': ('status', 'show', 'cat', 'list-units', 'list-unit-files', 'list-timers', 'list-sockets',
+                  'list-dependencies', 'is-active', 'is-enabled', 'is-failed', 'is-system-running', 'help')
+}
+READ_ONLY = {
+    'journalctl': ('--rotate', '--vacuum', '--flush', '--sync', '--relinquish-var', '--smart-relinquish-var',
+                   '--setup-keys', '--update-catalog')
+}
+READ_ONLY_REASON = "That's a system administration command that could affect running services. Let's stick to learning basics first."
+
+# Commands that take paths to change; the safety system checks where they point
+FILE_COMMANDS = ('rm', 'mv', 'cp', 'chmod', 'chown', 'touch', 'mkdir')
+
+# name -> (regexes, reason); matched case-insensitively by the safety system
+DANGER_RULES = {
+    # File system destruction
+    'rm': (
+        (r'rm\s+(-rf|--recursive.*--force)', r'rm\s+-[a-zA-Z]*r[a-zA-Z]*f', r'rm\s+-[a-zA-Z]*f[a-zA-Z]*r'),
+        "The 'rm -rf' command can permanently delete files and folders without asking. That's too dangerous for learning!"
+    ),
+    'dd': (
+        (r'dd\s+if=.*of=', r'dd\s+of=/dev/'),
+        "The 'dd' command can overwrite entire drives. We definitely don't want to use that while learning!"
+    ),
+    'mkfs': (
+        (r'mkfs',),
+        "The 'mkfs' command formats drives, which would erase everything. Let's avoid that!"
+    ),
+
+    # System modification
+    'chmod': (
+        (r'chmod\s+777\s+/', r'chmod\s+-R\s+777', r'chmod\s+(-\S+\s+)*\S+\s+(~|\$HOME)/?(\s|$)'),
+        "Changing permissions on system directories can make your computer unsafe. Let's practice on safe files first."
+    ),
+    'chown': (
+        (r'chown\s+root', r'chown\s+.*:.*\s+/', r'chown\s+(-\S+\s+)*\S+\s+(~|\$HOME)/?(\s|$)'),
+        "Changing ownership of system files can break your computer. Let's stick to your own files for now."
+    ),
+
+    # Network and downloads
+    'curl': (
+        (r'curl.*\|.*sh', r'curl.*\|.*bash', r'curl.*>', r'curl\s+.*://'),
+        "Downloading and running scripts from the internet can be dangerous. Let's learn other commands first."
+    ),
+    'wget': (
+        (r'wget.*\|', r'wget.*>', r'wget\s+.*://'),
+        "Downloading files from the internet should be done carefully. Let's focus on local files for now."
+    ),
+
+    # Process and system control
+    'killall': (
+        (r'killall', r'pkill\s+-9'),
+        "Killing processes can make your system unstable. Let's learn gentler commands first."
+    ),
+    'reboot': (
+        (r'reboot', r'shutdown', r'halt', r'poweroff'),
+        "System restart commands should be used carefully. Let's keep learning without rebooting!"
+    ),
+
+    # Dangerous system areas
+    'system_dirs': (
+        (r'(rm|mv|cp|chmod|chown).*\s+/(etc|sys|proc|dev|boot|bin|sbin|usr/bin|usr/sbin)',
+         r'cd\s+/(etc|sys|proc|dev|boot|bin|sbin)'),
+        "System directories contain important files. Let's practice in safer areas like your home directory."
+    ),
+
+    # Fork bombs and resource exhaustion
+    'forkbomb': (
+        (r':\(\)\{.*\|.*&\}', r':()\{.*\}', r'while\s+true.*do', r'for.*in.*\`seq'),
+        "That looks like a fork bomb or infinite loop that could freeze your computer. Let's not do that!"
+    ),
+
+    # Privilege escalation
+    'sudo_dangerous': (
+        (r'sudo\s+(rm|dd|mkfs|chmod|chown).*/', r'sudo\s+.*>.*/(etc|sys|proc|dev)'),
+        "Using sudo with system-modifying commands can be dangerous. Let's learn the basics first."
+    )
+}
+DEFAULT_DANGER_REASON = "This command could potentially harm your system or data. Let's stick to safer learning commands for now."
+
+# Plain substrings the AI fallback rules refuse outright
+DANGEROUS_SUBSTRINGS = ('rm -rf', 'dd if=', 'mkfs', '> /dev/', 'chmod 777 /',
+                        'chown root', 'sudo rm', 'sudo dd', '://', 'curl', 'wget')
+DANGEROUS_SUBSTRING_REASON = "That command could potentially harm your system. Let's practice with safer commands first."
+
+ALTERNATIVES = {
+    'rm': ('ls', 'mv to_trash/', 'nano (to edit instead of delete)'),
+    'dd': ('cp', 'cat', 'less'),
+    'curl': ('cat local_file.txt', 'nano to create content'),
+    'wget': ('cp', 'touch to create files'),
+    'sudo': ('Try the command without sudo first', 'Ask for help if you need system access')
+}
+DEFAULT_ALTERNATIVES = ('ls', 'pwd', 'cd', 'cat')
+
+# What the story says when a learner tries a command on their own
+ACKNOWLEDGMENTS = {
+    'pwd': "[SHELL] Good! You're checking where you are. That's always smart.",
+    'ls': "[SHELL] Excellent! Always good to see what's around you.",
+    'cd': "[SHELL] Nice navigation! You're getting comfortable moving around.",
+    'cat': "[SHELL] Reading files directly - you're becoming quite the explorer!",
+    'nano': "[SHELL] Ah, editing files! That's getting more advanced.",
+    'mkdir': "[SHELL] Creating directories? You're really taking control now!",
+    'touch': "[SHELL] Creating files! You're becoming quite the computer user."
+}
+
+SUGGESTIONS = 5
+COMMAND_SEPARATORS = re.compile(r"[|;&]+")
+# Pipes, chains, redirects and substitutions: never trusted without asking the AI
+SHELL_SYNTAX = re.compile(r"[|;&<>`$]")
+
+
+def base_command(command: str) -> str:
+    """The program a command line runs ("ls -la" -> "ls")"""
+    words = command.split()
+    return words[0] if words else ""
+
+
+class CommandKnowledgeBase:
+    """
+    Frozen per-level lookup tables over the definitions above
+
+    Every query is a dict or frozenset lookup; nothing is rebuilt per command.
+    Tutorials come from the story content and are read on first use.
+    """
+
+    def __init__(self, game_dir: Path = GAME_DIR, tutorials: Optional[Mapping[str, Dict[str, Any]]] = None):
+        self.game_dir = Path(game_dir)
+
+        levels = {}
+        for level, commands in COMMAND_LEVELS.items():
+            for command in commands:
+                levels.setdefault(command, level)
+        self.level_of: Mapping[str, int] = MappingProxyType(levels)
+
+        # curriculum[level] lists everything taught up to that level, in
+        # teaching order, and allowed[level] holds the same as a set; levels
+        # below 1 (progress before the first lesson) get level 1
+        curriculum, taught = [], ()
+        for level in range(1, MAX_LEVEL + 1):
+            taught += COMMAND_LEVELS.get(level, ())
+            curriculum.append(taught)
+        self.curriculum: Tuple[Tuple[str, ...], ...] = (curriculum[0],) + tuple(curriculum)
+        self.allowed: Tuple[FrozenSet[str], ...] = tuple(frozenset(commands) for commands in self.curriculum)
+        self.known: FrozenSet[str] = self.allowed[-1]
+
+        self.read_only_verbs: Mapping[str, FrozenSet[str]] = MappingProxyType(
+            {command: frozenset(verbs) for command, verbs in READ_ONLY_VERBS.items()})
+        self.read_only: Mapping[str, Tuple[str, ...]] = MappingProxyType(dict(READ_ONLY))
+        self.file_commands: FrozenSet[str] = frozenset(FILE_COMMANDS)
+        self.danger_rules: Tuple[Tuple[str, Any, str], ...] = tuple(
+            (name, re.compile("|".join(f"(?:{pattern})" for pattern in patterns), re.IGNORECASE), reason)
+            for name, (patterns, reason) in DANGER_RULES.items()
+        )
+        self.dangerous_substrings: Tuple[str, ...] = DANGEROUS_SUBSTRINGS
+        self.alternatives: Mapping[str, Tuple[str, ...]] = MappingProxyType(dict(ALTERNATIVES))
+        self.acknowledgments: Mapping[str, str] = MappingProxyType(dict(ACKNOWLEDGMENTS))
+
+        self._tutorials = MappingProxyType(dict(tutorials)) if tutorials is not None else None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Levels
+    # ------------------------------------------------------------------
+
+    def allowed_at(self, level: int) -> FrozenSet[str]:
+        """Commands taught up to a level (clamped to 1..MAX_LEVEL)"""
+        return self.allowed[min(max(level, 0), MAX_LEVEL)]
+
+    def curriculum_at(self, level: int) -> Tuple[str, ...]:
+        """Commands taught up to a level, in the order they are taught"""
+        return self.curriculum[min(max(level, 0), MAX_LEVEL)]
+
+    def taught_at(self, level: int) -> Tuple[str, ...]:
+        """Commands first taught at exactly this level"""
+        level = min(max(level, 1), MAX_LEVEL)
+        return self.curriculum[level][len(self.curriculum[level - 1]) if level > 1 else 0:]
+
+    def suggestions_for(self, level: int) -> Tuple[str, ...]:
+        """The first few commands taught, to suggest instead of one that isn't allowed"""
+        return self.curriculum_at(level)[:SUGGESTIONS]
+
+    def is_allowed(self, command: str, level: int) -> bool:
+        return base_command(command) in self.allowed_at(level)
+
+    def read_only_violation(self, command: str) -> Optional[str]:
+        """Why a look-only command (systemctl, journalctl) is being used to change something, if it is"""
+        # Every command of a pipeline or chain, not just the first
+        for part in COMMAND_SEPARATORS.split(command):
+            words = part.split()
+            if not words:
+                continue
+            verbs = self.read_only_verbs.get(words[0])
+            if verbs is not None:
+                verb = next((word for word in words[1:] if not word.startswith('-')), None)
+                if (verb is not None and verb not in verbs) or '--now' in words:
+                    return READ_ONLY_REASON
+            blocked = self.read_only.get(words[0])
+            if blocked and any(word.startswith(option) for word in words[1:] for option in blocked):
+                return READ_ONLY_REASON
+        return None
+
+    # ------------------------------------------------------------------
+    # Danger
+    # ------------------------------------------------------------------
+
+    def danger_for(self, command: str) -> Optional[str]:
+        """The reason of the first danger rule a command matches, or None"""
+        for name, pattern, reason in self.danger_rules:
+            if pattern.search(command):
+                return reason
+        return None
+
+    def has_dangerous_substring(self, command: str) -> bool:
+        lowered = command.lower()
+        return any(substring in lowered for substring in self.dangerous_substrings)
+
+    def alternatives_for(self, command: str) -> Tuple[str, ...]:
+        return self.alternatives.get(base_command(command), DEFAULT_ALTERNATIVES)
+
+    # ------------------------------------------------------------------
+    # Tutorials
+    # ------------------------------------------------------------------
+
+    @property
+    def tutorials(self) -> Mapping[str, Dict[str, Any]]:
+        """The story's command tutorials, read from the content bundle on first use"""
+        if self._tutorials is None:
+            with self._lock:
+                if self._tutorials is None:
+                    from content_bundle import load_content
+                    engine = load_content(self.game_dir).engine
+                    tutorials = engine.command_tutorials if engine is not None else {}
+                    self._tutorials = MappingProxyType(dict(tutorials))
+        return self._tutorials
+
+    def tutorial(self, command: str) -> Optional[Dict[str, Any]]:
+        return self.tutorials.get(base_command(command))
+
+
+# Shared by every subsystem (and every session of the session server)
+KNOWLEDGE_BASE = CommandKnowledgeBase()
@@ -0,0 +1,349 @@
+"""
+Content Bundle for Terminal Quest: Remastered
+Validates story_content.json and ascii_art.json and compiles them into one
+prebuilt, chapter-indexed cache file; startup reads only the index
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from content_store import DEFAULT_MAX_RESIDENT, ContentStore, pack_chapters
+from progress import write_atomically
+from story_engine import StoryEngine
+
+# Bump when the bundle layout changes
+BUNDLE_VERSION = 2
+# The file starts with the header length, then the pickled header, then the blobs
+HEADER_PREFIX = struct.Struct("<Q")
+
+STORY_FILE = "story_content.json"
+ART_FILE = "ascii_art.json"
+# Code that shapes the bundle; editing it invalidates old bundles too
+CODE_FILES = ("story_engine.py", "content_store.py", "content_bundle.py")
+
+
+class ContentError(ValueError):
+    """Raised when a content file is malformed"""
+
+
+class ContentBundle:
+    """
+    Loaded content shared by every consumer in the process
+
+    engine is a ContentStore (None without a story file) that reads chapters
+    on demand; the full ASCII art table is likewise read on first access.
+    """
+
+    def __init__(self, header: Dict[str, Any], read_blob, path: Optional[Path], rebuilt: bool,
+                 max_resident: int = DEFAULT_MAX_RESIDENT, fd: Optional[int] = None):
+        index = header["story"]
+        self.engine = ContentStore(index, read_blob, max_resident) if index is not None else None
+        self.read_blob = read_blob
+        self.art_location = header["art"]
+        self.path = path
+        self.rebuilt = rebuilt
+        self._fd = fd
+        self._art = None
+        self._art_lock = threading.Lock()
+
+    def _load_art(self):
+        with self._art_lock:
+            if self._art is None:
+                if self.art_location is None:
+                    self._art = (None, {})
+                else:
+                    self._art = pickle.loads(self.read_blob(*self.art_location))
+            return self._art
+
+    @property
+    def art(self) -> Optional[Dict[str, Any]]:
+        return self._load_art()[0]
+
+    @property
+    def frames(self) -> Dict[str, str]:
+        return self._load_art()[1]
+
+    def close(self):
+        """Release the bundle file (only needed for short-lived bundles)"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+# ----------------------------------------------------------------------
+# Validation
+# ----------------------------------------------------------------------
+
+def validate_story(data: Any, source: str = STORY_FILE):
+    """Check the story file's shape; raises ContentError"""
+    if not isinstance(data, dict) or not isinstance(data.get("chapters"), dict):
+        raise ContentError(f"{source}: expected an object with a 'chapters' object")
+
+    for chapter_key, chapter in data["chapters"].items():
+        if not str(chapter_key).isdigit():
+            raise ContentError(f"{source}: chapter key '{chapter_key}' must be a number")
+        sections = chapter.get("sections") if isinstance(chapter, dict) else None
+        if not isinstance(sections, dict):
+            raise ContentError(f"{source}: chapter {chapter_key} needs a 'sections' object")
+        for section_id, section in sections.items():
+            if not isinstance(section, dict) or not isinstance(section.get("text", ""), str):
+                raise ContentError(f"{source}: section {chapter_key}/{section_id} needs a 'text' string")
+
+    # The engine enforces the cross-section rules (unique lesson contexts etc.)
+    try:
+        StoryEngine(data)
+    except ValueError as e:
+        raise ContentError(f"{source}: {e}")
+
+
+def validate_art(data: Any, source: str = ART_FILE):
+    """Check the ASCII art file's shape; raises ContentError"""
+    if not isinstance(data, dict):
+        raise ContentError(f"{source}: expected an object of components")
+
+    for name, component in data.items():
+        if not isinstance(component, dict):
+            raise ContentError(f"{source}: component '{name}' must be an object")
+        art = component.get("art")
+        if not isinstance(art, list) or not all(isinstance(line, str) for line in art):
+            raise ContentError(f"{source}: component '{name}' needs an 'art' list of strings")
+        if not isinstance(component.get("caption", ""), str):
+            raise ContentError(f"{source}: component '{name}' has a non-string caption")
+
+
+# ----------------------------------------------------------------------
+# Compilation
+# ----------------------------------------------------------------------
+
+def _intern(value):
+    """Intern every string so duplicates share one object (pickle then stores them once)"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return [_intern(item) for item in value]
+    if isinstance(value, dict):
+        return {_intern(key): _intern(item) for key, item in value.items()}
+    return value
+
+
+def _read_json(path: Path, validator):
+    """Parse and validate one source file; None if it doesn't exist"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except json.JSONDecodeError as e:
+        raise ContentError(f"{path.name}: invalid JSON ({e})")
+
+    validator(data, path.name)
+    return _intern(data)
+
+
+def compile_content(game_dir: Path):
+    """
+    Validate the sources and split them into blobs
+
+    Returns:
+        tuple: (header, blobs); header offsets point into the concatenated blobs
+    """
+    game_dir = Path(game_dir)
+    story = _read_json(game_dir / STORY_FILE, validate_story)
+    art = _read_json(game_dir / ART_FILE, validate_art)
+    # Each component printed with a single write
+    frames = {name: sys.intern("\n".join(component["art"])) for name, component in (art or {}).items()}
+
+    index, blobs = None, []
+    if story is not None:
+        index, blobs = pack_chapters(StoryEngine(story), art, frames)
+
+    art_location = None
+    if art is not None:
+        art_blob = pickle.dumps((art, frames), protocol=pickle.HIGHEST_PROTOCOL)
+        art_location = (sum(len(blob) for blob in blobs), len(art_blob))
+        blobs.append(art_blob)
+
+    return {"story": index, "art": art_location}, blobs
+
+
+def _fingerprint(path: Path, previous: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """mtime/size/sha256 of a file; the hash is reused when mtime and size are unchanged"""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+
+    if previous and previous.get("mtime_ns") == stat.st_mtime_ns and previous.get("size") == stat.st_size:
+        return previous
+
+    return {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": hashlib.sha256(path.read_bytes()).hexdigest()
+    }
+
+
+def _source_paths(game_dir: Path):
+    code_dir = Path(__file__).parent
+    paths = {name: game_dir / name for name in (STORY_FILE, ART_FILE)}
+    paths.update({name: code_dir / name for name in CODE_FILES})
+    return paths
+
+
+def default_bundle_path(game_dir: Path) -> Path:
+    """Per-install bundle location in the user's cache directory"""
+    cache_home = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    key = hashlib.sha256(str(Path(game_dir).resolve()).encode()).hexdigest()[:12]
+    return cache_home / "terminal_quest" / f"content-{key}.bundle"
+
+
+def _encode(header: Dict[str, Any], blobs) -> bytes:
+    encoded = pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL)
+    return b"".join([HEADER_PREFIX.pack(len(encoded)), encoded, *blobs])
+
+
+def _open_blobs(path: Path, base: int):
+    """
+    Blob reader over an open descriptor
+
+    Reading by descriptor (not path) keeps offsets valid even if the bundle
+    is rebuilt and replaced while this process is still using the old one.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    return fd, lambda offset, length: os.pread(fd, length, base + offset)
+
+
+def build_bundle(game_dir: Path, bundle_path: Optional[Path] = None,
+                 max_resident: int = DEFAULT_MAX_RESIDENT) -> ContentBundle:
+    """Compile the sources and (if possible) write the bundle file"""
+    game_dir = Path(game_dir)
+    bundle_path = bundle_path or default_bundle_path(game_dir)
+
+    header, blobs = compile_content(game_dir)
+    header.update(version=BUNDLE_VERSION,
+                  sources={name: _fingerprint(path) for name, path in _source_paths(game_dir).items()})
+    data = _encode(header, blobs)
+    try:
+        bundle_path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomically(bundle_path, data)
+        fd, read_blob = _open_blobs(bundle_path, len(data) - sum(len(blob) for blob in blobs))
+    except OSError:
+        # Read-only cache (e.g. a locked-down lab account): keep the blobs in memory
+        blob_area = b"".join(blobs)
+        return ContentBundle(header, lambda offset, length: blob_area[offset:offset + length],
+                             None, rebuilt=True, max_resident=max_resident)
+
+    return ContentBundle(header, read_blob, bundle_path, rebuilt=True, max_resident=max_resident, fd=fd)
+
+
+def read_bundle(game_dir: Path, bundle_path: Optional[Path] = None,
+                max_resident: int = DEFAULT_MAX_RESIDENT) -> Optional[ContentBundle]:
+    """Load the bundle's index if every source still matches; None if it must be rebuilt"""
+    game_dir = Path(game_dir)
+    bundle_path = bundle_path or default_bundle_path(game_dir)
+    try:
+        with open(bundle_path, 'rb') as f:
+            (length,) = HEADER_PREFIX.unpack(f.read(HEADER_PREFIX.size))
+            stored = pickle.loads(f.read(length))
+            blobs_start = HEADER_PREFIX.size + length
+    except (OSError, struct.error, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+    if not isinstance(stored, dict) or stored.get("version") != BUNDLE_VERSION:
+        return None
+
+    recorded = stored.get("sources", {})
+    refreshed = {}
+    for name, path in _source_paths(game_dir).items():
+        previous = recorded.get(name)
+        current = _fingerprint(path, previous)
+        if current is None or previous is None:
+            if current != previous:
+                return None
+        elif current["sha256"] != previous["sha256"]:
+            return None
+        refreshed[name] = current
+
+    try:
+        fd, read_blob = _open_blobs(bundle_path, blobs_start)
+    except OSError:
+        return None
+
+    if refreshed != recorded:
+        # Touched but identical: record the new mtimes so we don't hash again
+        stored["sources"] = refreshed
+        # (our descriptor still points at the old file, whose offsets stay valid)
+        try:
+            blob_area = os.pread(fd, os.fstat(fd).st_size - blobs_start, blobs_start)
+            write_atomically(bundle_path, _encode(stored, [blob_area]))
+        except OSError:
+            pass
+
+    return ContentBundle(stored, read_blob, bundle_path, rebuilt=False, max_resident=max_resident, fd=fd)
+
+
+_loaded: Dict[Path, ContentBundle] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_content(game_dir: Path) -> ContentBundle:
+    """The process-wide content for a game directory, rebuilding the bundle if stale"""
+    key = Path(game_dir).resolve()
+    with _loaded_lock:
+        bundle = _loaded.get(key)
+        if bundle is None:
+            bundle = read_bundle(key) or build_bundle(key)
+            _loaded[key] = bundle
+        return bundle
+
+
+def invalidate(game_dir: Path):
+    """Forget the in-process copy (after content files were edited)"""
+    with _loaded_lock:
+        _loaded.pop(Path(game_dir).resolve(), None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate and precompile Terminal Quest content')
+    parser.add_argument('--game-dir', type=Path, default=Path(__file__).parent, help='Directory with the content files')
+    parser.add_argument('--output', type=Path, help='Bundle path (default: user cache directory)')
+    parser.add_argument('--check', action='store_true', help='Only validate the content files')
+    args = parser.parse_args()
+
+    try:
+        if args.check:
+            compile_content(args.game_dir)
+            print("[CONTENT] Content files are valid")
+            return
+
+        start = time.perf_counter()
+        bundle = build_bundle(args.game_dir, args.output)
+        built = time.perf_counter() - start
+
+        if bundle.path is None:
+            print("[CONTENT] Content is valid, but the bundle could not be written")
+            sys.exit(1)
+
+        start = time.perf_counter()
+        read_bundle(args.game_dir, bundle.path).close()
+        loaded = time.perf_counter() - start
+    except ContentError as e:
+        print(f"[CONTENT] {e}")
+        sys.exit(1)
+
+    bundle.close()
+    print(f"[CONTENT] Wrote {bundle.path} ({bundle.path.stat().st_size} bytes)")
+    print(f"[CONTENT] Compile: {built * 1000:.1f}ms, load: {loaded * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
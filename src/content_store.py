@@ -0,0 +1,354 @@
+"""
+Content Store for Terminal Quest: Remastered
+Chapter-indexed story content: each chapter's sections and art are stored
+as a separate blob and only loaded while a player is in that chapter
+"""
+
+import argparse
+import bisect
+import gc
+import json
+import pickle
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from story_engine import StoryEngine, canonical_command
+
+# Chapters kept in memory at once per player; the one being played plus the one just left
+DEFAULT_MAX_RESIDENT = 2
+
+
+class ChapterContent:
+    """One loaded chapter"""
+
+    __slots__ = ("chapter", "sections", "triggers", "art", "frames")
+
+    def __init__(self, chapter: int, sections, triggers, art, frames):
+        self.chapter = chapter
+        self.sections = sections
+        # (lesson_context, canonical command) -> index of the section to play next
+        self.triggers = triggers
+        # Only the ASCII art components this chapter's sections show
+        self.art = art
+        self.frames = frames
+
+
+def pack_chapters(engine: StoryEngine, art: Optional[Dict[str, Any]], frames: Dict[str, str]) -> Tuple[Dict[str, Any], List[bytes]]:
+    """
+    Split a compiled story into per-chapter blobs plus a small index
+
+    Returns:
+        tuple: (index, blobs); index["chapters"] maps chapter -> (offset, length)
+        into the concatenated blobs
+    """
+    art = art or {}
+    blobs = []
+    chapters = {}
+    offset = 0
+
+    chapter_triggers = {}
+    for key, target in engine.trigger_index.items():
+        chapter = engine.sections[engine.context_index[key[0]]].chapter
+        chapter_triggers.setdefault(chapter, {})[key] = target
+
+    starts = sorted(engine.chapter_starts.items(), key=lambda item: item[1])
+    for position, (chapter, start) in enumerate(starts):
+        end = starts[position + 1][1] if position + 1 < len(starts) else len(engine)
+        sections = engine.sections[start:end]
+        shown = {section.show_ascii for section in sections if section.show_ascii in art}
+        triggers = chapter_triggers.get(chapter, {})
+        blob = pickle.dumps(
+            (sections, triggers, {name: art[name] for name in shown}, {name: frames[name] for name in shown}),
+            protocol=pickle.HIGHEST_PROTOCOL
+        )
+        chapters[chapter] = (offset, len(blob))
+        blobs.append(blob)
+        offset += len(blob)
+
+    index = {
+        "chapters": chapters,
+        "chapter_titles": engine.chapter_titles,
+        "chapter_starts": engine.chapter_starts,
+        "context_index": engine.context_index,
+        "command_tutorials": engine.command_tutorials,
+        "total_sections": len(engine)
+    }
+    return index, blobs
+
+
+class ContentStore:
+    """
+    Lazy stand-in for StoryEngine backed by a chapter index
+
+    Only the index (titles, chapter starts, lesson contexts) is resident;
+    chapters are read through read_blob(offset, length) on first use and
+    evicted least-recently-used once more than max_resident are loaded.
+    max_resident is per player: a store shared by several sessions keeps
+    room for each of them (see add_reader).
+    """
+
+    def __init__(self, index: Dict[str, Any], read_blob: Callable[[int, int], bytes],
+                 max_resident: int = DEFAULT_MAX_RESIDENT):
+        self.chapter_offsets = index["chapters"]
+        self.chapter_titles = index["chapter_titles"]
+        self.chapter_starts = index["chapter_starts"]
+        self.context_index = index["context_index"]
+        self.command_tutorials = index["command_tutorials"]
+        self.total_sections = index["total_sections"]
+        self.read_blob = read_blob
+        self.per_reader = max(1, int(max_resident))
+        self.max_resident = self.per_reader
+        # Sessions playing from this store (a single game never registers)
+        self.readers = 0
+
+        # Sorted chapter starts for index -> chapter lookups
+        ordered = sorted(self.chapter_starts.items(), key=lambda item: item[1])
+        self._start_positions = [start for _, start in ordered]
+        self._start_chapters = [chapter for chapter, _ in ordered]
+
+        self.resident: "OrderedDict[int, ChapterContent]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return self.total_sections
+
+    def chapter_of(self, index: int) -> Optional[int]:
+        """Chapter that contains a section position"""
+        if not 0 <= index < self.total_sections:
+            return None
+        return self._start_chapters[bisect.bisect_right(self._start_positions, index) - 1]
+
+    def load_chapter(self, chapter: int) -> ChapterContent:
+        """A chapter's content, reading it from the store if it isn't resident"""
+        with self.lock:
+            content = self.resident.get(chapter)
+            if content is not None:
+                self.resident.move_to_end(chapter)
+                return content
+
+            offset, length = self.chapter_offsets[chapter]
+            sections, triggers, art, frames = pickle.loads(self.read_blob(offset, length))
+            content = ChapterContent(chapter, sections, triggers, art, frames)
+            self.resident[chapter] = content
+            self.loads += 1
+
+            self._evict()
+            return content
+
+    def _evict(self):
+        while len(self.resident) > self.max_resident:
+            self.resident.popitem(last=False)
+            self.evictions += 1
+
+    def add_reader(self):
+        """Another session plays from this store: make room for its chapters too"""
+        with self.lock:
+            self.readers += 1
+            self.max_resident = self.per_reader * self.readers
+
+    def remove_reader(self):
+        """A session finished: shrink back, evicting the chapters it no longer needs"""
+        with self.lock:
+            self.readers = max(0, self.readers - 1)
+            self.max_resident = self.per_reader * max(1, self.readers)
+            self._evict()
+
+    def section_at(self, index: int):
+        """Section at a position, or None past the end of the story"""
+        chapter = self.chapter_of(index)
+        if chapter is None:
+            return None
+        return self.load_chapter(chapter).sections[index - self.chapter_starts[chapter]]
+
+    def match_trigger(self, lesson_context: Optional[str], command: str) -> Optional[int]:
+        """Where does this command take a player in this lesson? Only that lesson's chapter is consulted"""
+        position = self.context_index.get(lesson_context) if lesson_context else None
+        if position is None:
+            return None
+        triggers = self.load_chapter(self.chapter_of(position)).triggers
+        return triggers.get((lesson_context, canonical_command(command)))
+
+    def art_for(self, chapter: int, name: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """(component, pre-joined frame) for art shown in a chapter, if the chapter carries it"""
+        content = self.load_chapter(chapter)
+        if name not in content.art:
+            return None
+        return content.art[name], content.frames[name]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "chapters": len(self.chapter_offsets),
+                "resident": list(self.resident),
+                "max_resident": self.max_resident,
+                "readers": self.readers,
+                "loads": self.loads,
+                "evictions": self.evictions
+            }
+
+
+# ----------------------------------------------------------------------
+# Benchmark: eager load vs chapter store on a synthetic content pack
+# ----------------------------------------------------------------------
+
+def write_synthetic_pack(game_dir: Path, chapters: int, sections_per_chapter: int = 12):
+    """Write a story_content.json/ascii_art.json pair of the requested size"""
+    paragraph = ("The system hums quietly while SHELL explains how the pieces fit together. " * 4).strip()
+    story = {"chapters": {}, "command_tutorials": {}}
+    art = {}
+
+    for chapter in range(chapters):
+        component = f"component_{chapter}"
+        art[component] = {
+            "art": [f"║{'░▒▓█'[(chapter + row) % 4] * 58}║" for row in range(18)],
+            "caption": f"Component {chapter}, pictured in all its glory."
+        }
+        sections = {}
+        for number in range(sections_per_chapter):
+            section = {"speaker": "SHELL", "text": f"Chapter {chapter}, part {number}.\n\n{paragraph}\n\n{paragraph}"}
+            if number == sections_per_chapter // 2:
+                section["show_ascii"] = component
+            if number == sections_per_chapter - 1:
+                section["expected_command"] = f"ls chapter{chapter}"
+                section["lesson_context"] = f"lesson_{chapter}"
+            sections[f"section_{number}"] = section
+        story["chapters"][str(chapter)] = {"title": f"Synthetic Chapter {chapter}", "sections": sections}
+
+    with open(game_dir / "story_content.json", 'w') as f:
+        json.dump(story, f)
+    with open(game_dir / "ascii_art.json", 'w') as f:
+        json.dump(art, f)
+
+
+# Sections each simulated session plays in the multi-session run
+SESSION_STEPS = 60
+
+
+def _first_prompt(engine, frames_for) -> int:
+    """
+    Walk from the start to the first section that waits for a command
+
+    Measures loading each section a player passes and building its art
+    frames; printing the text itself is left out.
+    """
+    position = 0
+    while True:
+        section = engine.section_at(position)
+        if section is None or section.waits_for_command:
+            return position
+        if section.show_ascii:
+            frames_for(section)
+        position += 1
+
+
+def _measure(label: str, func) -> Dict[str, Any]:
+    """Run func under tracemalloc; memory still held afterwards is what stays resident"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    keep = func()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if hasattr(keep, "close"):
+        keep.close()
+    return {"label": label, "seconds": elapsed, "resident_bytes": current, "peak_bytes": peak}
+
+
+def run_benchmark(chapters: int = 500, max_resident: int = DEFAULT_MAX_RESIDENT,
+                  sessions: int = 8) -> List[Dict[str, Any]]:
+    """Time-to-first-prompt and memory for the eager load and the chapter store"""
+    import content_bundle
+
+    with tempfile.TemporaryDirectory(prefix="tq-content-") as tmp:
+        game_dir = Path(tmp)
+        write_synthetic_pack(game_dir, chapters)
+        bundle_path = game_dir / "content.bundle"
+
+        def eager():
+            # What startup did before the chapter store: parse and compile everything
+            with open(game_dir / "story_content.json") as f:
+                engine = StoryEngine(json.load(f))
+            with open(game_dir / "ascii_art.json") as f:
+                art = json.load(f)
+            frames = {name: "\n".join(component["art"]) for name, component in art.items()}
+            _first_prompt(engine, lambda section: frames[section.show_ascii])
+            return engine, art, frames
+
+        def lazy(build):
+            if build:
+                bundle = content_bundle.build_bundle(game_dir, bundle_path, max_resident)
+            else:
+                bundle = content_bundle.read_bundle(game_dir, bundle_path, max_resident)
+            store = bundle.engine
+            _first_prompt(store, lambda section: store.art_for(section.chapter, section.show_ascii))
+            return bundle
+
+        results = [
+            _measure("eager (json + compile)", eager),
+            _measure("chapter store, first run (build)", lambda: lazy(True)),
+            _measure("chapter store, cached", lambda: lazy(False))
+        ]
+
+        # Play every chapter through to show residency stays bounded
+        bundle = content_bundle.read_bundle(game_dir, bundle_path, max_resident)
+        store = bundle.engine
+        for position in range(len(store)):
+            store.section_at(position)
+        stats = store.get_stats()
+        results.append({"label": "full playthrough", "loads": stats["loads"],
+                        "evictions": stats["evictions"], "resident": len(stats["resident"])})
+        bundle.close()
+
+        # Several sessions in different chapters, as on the session server: each
+        # one's chapters should stay resident while the others play
+        bundle = content_bundle.read_bundle(game_dir, bundle_path, max_resident)
+        store = bundle.engine
+        sessions = max(1, sessions)
+        starts = sorted(store.chapter_starts.values())
+        players = [starts[len(starts) * player // sessions] for player in range(sessions)]
+        for _ in range(sessions):
+            store.add_reader()
+        for step in range(min(len(store) // sessions, SESSION_STEPS)):
+            for position in players:
+                store.section_at(position + step)
+        stats = store.get_stats()
+        results.append({"label": f"{sessions} sessions", "loads": stats["loads"],
+                        "evictions": stats["evictions"], "resident": len(stats["resident"])})
+        bundle.close()
+    return results
+
+
+def print_benchmark(results: List[Dict[str, Any]], chapters: int):
+    print(f"[CONTENT] Synthetic pack: {chapters} chapters")
+    print(f"{'load':<34}{'first prompt':>14}{'resident':>12}{'peak':>12}")
+    for row in results:
+        if "seconds" not in row:
+            continue
+        print(f"{row['label']:<34}{row['seconds'] * 1000:>12.1f}ms"
+              f"{row['resident_bytes'] / 1024:>10.0f}KB{row['peak_bytes'] / 1024:>10.0f}KB")
+    for row in results:
+        if "loads" in row:
+            print(f"[CONTENT] {row['label'].capitalize()}: {row['loads']} chapter loads, "
+                  f"{row['evictions']} evictions, {row['resident']} chapters resident at the end")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark lazy chapter loading against the eager load')
+    parser.add_argument('--chapters', type=int, default=500, help='Chapters in the synthetic pack')
+    parser.add_argument('--max-resident', type=int, default=DEFAULT_MAX_RESIDENT, help='Chapters kept in memory per player')
+    parser.add_argument('--sessions', type=int, default=8, help='Players interleaved in the multi-session run')
+    args = parser.parse_args()
+
+    print_benchmark(run_benchmark(args.chapters, args.max_resident, args.sessions), args.chapters)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Event Log for Terminal Quest: Remastered
+Append-only JSONL record of what learners typed, what the AI analyzer and
+safety rules decided, and how long each step took. Events are queued and
+written by a background thread; files rotate by size and old ones can be
+gzip-compressed.
+"""
+
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+# Events queued beyond this are dropped (and counted) rather than blocking the prompt
+DEFAULT_QUEUE_SIZE = 10000
+FLUSH_INTERVAL = 1.0
+
+_CLOSE = object()
+
+
+def elapsed_ms(start: float) -> float:
+    """Milliseconds since a perf_counter() reading, as stored in events"""
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+def rotated_path(path: Path, number: int, compress: bool) -> Path:
+    """events.jsonl -> events.jsonl.1 (or events.jsonl.1.gz)"""
+    return path.with_name(f"{path.name}.{number}" + (".gz" if compress else ""))
+
+
+class EventLog:
+    def __init__(self, path: Path, max_bytes: int = DEFAULT_MAX_BYTES, backups: int = DEFAULT_BACKUPS,
+                 compress: bool = True, queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        Args:
+            path: The live log file; rotated files sit next to it
+            max_bytes: Rotate once the live file reaches this size
+            backups: Rotated files to keep
+            compress: gzip rotated files
+        """
+        self.path = Path(path).expanduser()
+        self.max_bytes = max_bytes
+        self.backups = max(1, backups)
+        self.compress = compress
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.written = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], home_dir: Path) -> Optional["EventLog"]:
+        """Build from the 'event_log' block of config.json; None if logging is off"""
+        settings = config.get('event_log', {})
+        if not settings.get('enabled', False):
+            return None
+        path = settings.get('file') or home_dir / ".terminal_quest_events.jsonl"
+        return cls(path, settings.get('max_bytes', DEFAULT_MAX_BYTES), settings.get('backups', DEFAULT_BACKUPS),
+                   settings.get('compress', True))
+
+    def log(self, event_type: str, **fields):
+        """Queue one event; never blocks (events are dropped if the writer can't keep up)"""
+        if self._thread is None:
+            self._start()
+        event = {"t": round(time.time(), 3), "type": event_type}
+        event.update(fields)
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._spawn()
+
+    def _spawn(self):
+        self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        out = open(self.path, 'a', encoding='utf-8')
+        size = out.tell()
+        try:
+            while True:
+                try:
+                    event = self.queue.get(timeout=FLUSH_INTERVAL)
+                except queue.Empty:
+                    continue
+
+                # Drain whatever else is waiting, then flush once for the batch
+                batch = [event]
+                while len(batch) < 1000:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                closing = False
+                for event in batch:
+                    if event is _CLOSE:
+                        closing = True
+                        continue
+                    line = json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+                    out.write(line)
+                    size += len(line.encode('utf-8'))
+                    self.written += 1
+                    if size >= self.max_bytes:
+                        out.close()
+                        self._rotate()
+                        out = open(self.path, 'a', encoding='utf-8')
+                        size = 0
+                out.flush()
+                if closing:
+                    return
+        finally:
+            out.close()
+
+    def _rotate(self):
+        """Shift events.jsonl.N up by one, dropping the oldest, and start a fresh file"""
+        oldest = rotated_path(self.path, self.backups, self.compress)
+        if oldest.exists():
+            oldest.unlink()
+        for number in range(self.backups - 1, 0, -1):
+            source = rotated_path(self.path, number, self.compress)
+            if source.exists():
+                os.replace(source, rotated_path(self.path, number + 1, self.compress))
+
+        if not self.compress:
+            os.replace(self.path, rotated_path(self.path, 1, False))
+            return
+        # Compress to a temp name first so readers never see a partial .gz
+        target = rotated_path(self.path, 1, True)
+        partial = target.with_name(target.name + ".tmp")
+        with open(self.path, 'rb') as source, gzip.open(partial, 'wb') as compressed:
+            shutil.copyfileobj(source, compressed)
+        os.replace(partial, target)
+        self.path.unlink()
+
+    def close(self):
+        """Write out everything queued so far and stop the writer"""
+        with self._lock:
+            while self._thread is not None:
+                self.queue.put(_CLOSE)
+                self._thread.join()
+                self._thread = None
+                # Events queued while the writer was finishing up would otherwise wait for the next log()
+                if not self.queue.empty():
+                    self._spawn()
@@ -0,0 +1,333 @@
+"""
+Log Analytics for Terminal Quest: Remastered
+Streams over event logs (live, rotated and gzip-compressed, from any number
+of learners or servers) and reports per-chapter, per-lesson and per-command
+aggregates: where learners stall, what gets blocked or falls back to the
+basic rules, and how long commands take
+"""
+
+import argparse
+import gzip
+import json
+import re
+import sys
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence
+
+from metrics import bucket_quantile
+
+# Upper bounds in milliseconds for the per-chapter latency distributions
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+STAGES = ("analysis", "safety", "execution", "story")
+# Distinct commands tracked before the rest are pooled, so memory stays bounded
+MAX_COMMANDS = 5000
+OTHER = "(other)"
+ROTATED = re.compile(r"^(?P<base>.+?)\.(?P<number>\d+)(\.gz)?$")
+
+
+# ----------------------------------------------------------------------
+# Reading
+# ----------------------------------------------------------------------
+
+def find_log_sets(paths: Sequence[Path]) -> List[List[Path]]:
+    """
+    Group log files into sets (a live log and its rotations), oldest file first
+
+    A learner's events continue from one rotated file into the next, so each
+    set is read in order by one worker.
+    """
+    files = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            files.extend(child for child in path.rglob("*") if child.is_file() and ".jsonl" in child.name)
+        else:
+            files.append(path)
+
+    sets = {}
+    for path in files:
+        match = ROTATED.match(path.name)
+        base, number = (match.group("base"), int(match.group("number"))) if match else (path.name, 0)
+        sets.setdefault(path.parent / base, []).append((number, path))
+
+    # events.jsonl.5.gz is the oldest, the live events.jsonl the newest
+    return [[path for _, path in sorted(group, reverse=True)] for _, group in sorted(sets.items())]
+
+
+def read_events(path: Path, stats: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+    """Events from one file, line by line; unreadable lines are counted and skipped"""
+    opener = gzip.open if path.suffix == ".gz" else open
+    try:
+        with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # Typically a line cut short by a crash
+                    stats["bad_lines"] += 1
+                    continue
+                if isinstance(event, dict):
+                    yield event
+    except (OSError, EOFError) as e:
+        print(f"[ANALYTICS] Skipping rest of {path}: {e}", file=sys.stderr)
+        stats["bad_files"] += 1
+
+
+# ----------------------------------------------------------------------
+# Aggregation
+# ----------------------------------------------------------------------
+
+def _stage_totals() -> Dict[str, float]:
+    return dict.fromkeys(STAGES, 0.0)
+
+
+class Aggregates:
+    """Mergeable running totals (plain data, so workers can send them back)"""
+
+    def __init__(self):
+        self.totals = {"events": 0, "commands": 0, "bad_lines": 0, "bad_files": 0, "files": 0}
+        self.chapters = {}
+        self.lessons = {}
+        self.commands = {}
+
+    def _chapter(self, chapter) -> Dict[str, Any]:
+        key = str(chapter)
+        if key not in self.chapters:
+            self.chapters[key] = {"commands": 0, "blocked": 0, "fallbacks": 0, "advanced": 0,
+                                  "latency": [0] * (len(LATENCY_BUCKETS_MS) + 1), "latency_sum": 0.0,
+                                  "stages": _stage_totals()}
+        return self.chapters[key]
+
+    def _lesson(self, chapter, lesson) -> Dict[str, Any]:
+        key = f"{chapter}/{lesson}"
+        if key not in self.lessons:
+            self.lessons[key] = {"chapter": chapter, "lesson": lesson, "commands": 0, "blocked": 0,
+                                 "learners": 0, "advanced": 0, "stalled": 0, "attempts_to_advance": 0,
+                                 "seconds_to_advance": 0.0}
+        return self.lessons[key]
+
+    def _command(self, command: str) -> Dict[str, Any]:
+        words = command.split()
+        key = words[0][:40] if words else ""
+        if key not in self.commands and len(self.commands) >= MAX_COMMANDS:
+            key = OTHER
+        if key not in self.commands:
+            self.commands[key] = {"count": 0, "blocked_ai": 0, "blocked_safety": 0, "fallbacks": 0,
+                                  "failed": 0, "total_ms": 0.0}
+        return self.commands[key]
+
+    def add_set(self, files: Sequence[Path]):
+        """Fold in one log set; learner state only lives while its set is read"""
+        # (session) -> where that learner is: lesson, attempts there, when they arrived
+        learners = {}
+        for path in files:
+            self.totals["files"] += 1
+            for event in read_events(path, self.totals):
+                self.totals["events"] += 1
+                if event.get("type") == "command":
+                    self.add_command(event, learners)
+
+        # Whoever never advanced past their last lesson stalled there
+        for state in learners.values():
+            self._lesson(state["chapter"], state["lesson"])["stalled"] += 1
+
+    def add_command(self, event: Dict[str, Any], learners: Dict[Any, Dict[str, Any]]):
+        self.totals["commands"] += 1
+        chapter, lesson = event.get("chapter"), event.get("lesson")
+        blocked = event.get("blocked")
+        fallback = event.get("ai_source") == "fallback"
+        total_ms = float(event.get("total_ms") or 0.0)
+
+        stats = self._chapter(chapter)
+        stats["commands"] += 1
+        stats["blocked"] += bool(blocked)
+        stats["fallbacks"] += fallback
+        stats["advanced"] += bool(event.get("advanced"))
+        stats["latency"][_bucket(total_ms)] += 1
+        stats["latency_sum"] += total_ms
+        for stage in STAGES:
+            stats["stages"][stage] += float(event.get(f"{stage}_ms") or 0.0)
+
+        command = self._command(event.get("command") or "")
+        command["count"] += 1
+        command["blocked_ai"] += blocked == "ai"
+        command["blocked_safety"] += blocked == "safety"
+        command["fallbacks"] += fallback
+        command["failed"] += bool(event.get("returncode")) or bool(event.get("error"))
+        command["total_ms"] += total_ms
+
+        if lesson is None:
+            return
+        lesson_stats = self._lesson(chapter, lesson)
+        lesson_stats["commands"] += 1
+        lesson_stats["blocked"] += bool(blocked)
+
+        session = event.get("session")
+        state = learners.get(session)
+        if state is None or state["lesson"] != lesson:
+            state = learners[session] = {"chapter": chapter, "lesson": lesson, "attempts": 0, "since": event.get("t")}
+            lesson_stats["learners"] += 1
+        state["attempts"] += 1
+
+        if event.get("advanced"):
+            lesson_stats["advanced"] += 1
+            lesson_stats["attempts_to_advance"] += state["attempts"]
+            if state["since"] is not None and event.get("t") is not None:
+                lesson_stats["seconds_to_advance"] += event["t"] - state["since"]
+            del learners[session]
+
+    def merge(self, other: "Aggregates"):
+        for key, value in other.totals.items():
+            self.totals[key] += value
+        for key, stats in other.chapters.items():
+            mine = self._chapter(key)
+            for field, value in stats.items():
+                if field == "latency":
+                    mine[field] = [a + b for a, b in zip(mine[field], value)]
+                elif field == "stages":
+                    for stage, seconds in value.items():
+                        mine[field][stage] += seconds
+                else:
+                    mine[field] += value
+        for key, stats in other.lessons.items():
+            mine = self._lesson(stats["chapter"], stats["lesson"])
+            for field, value in stats.items():
+                if field not in ("chapter", "lesson"):
+                    mine[field] += value
+        for key, stats in other.commands.items():
+            mine = self._command(key)
+            for field, value in stats.items():
+                mine[field] += value
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def report(self, top: int = 20) -> Dict[str, Any]:
+        """Derived figures: latency percentiles, stall and block rates, slowest lessons"""
+        chapters = {}
+        for key, stats in sorted(self.chapters.items(), key=lambda item: _chapter_order(item[0])):
+            count = stats["commands"]
+            chapters[key] = {
+                "commands": count,
+                "blocked": stats["blocked"],
+                "fallbacks": stats["fallbacks"],
+                "advanced": stats["advanced"],
+                "avg_ms": stats["latency_sum"] / count if count else 0.0,
+                "p50_ms": bucket_quantile(LATENCY_BUCKETS_MS, stats["latency"], 0.5),
+                "p95_ms": bucket_quantile(LATENCY_BUCKETS_MS, stats["latency"], 0.95),
+                "stage_avg_ms": {stage: total / count if count else 0.0 for stage, total in stats["stages"].items()}
+            }
+
+        lessons = []
+        for stats in self.lessons.values():
+            advanced = stats["advanced"]
+            lessons.append({
+                "chapter": stats["chapter"],
+                "lesson": stats["lesson"],
+                "learners": stats["learners"],
+                "stalled": stats["stalled"],
+                "commands": stats["commands"],
+                "blocked": stats["blocked"],
+                "attempts_to_advance": stats["attempts_to_advance"] / advanced if advanced else None,
+                "seconds_to_advance": stats["seconds_to_advance"] / advanced if advanced else None
+            })
+        lessons.sort(key=lambda lesson: (lesson["stalled"], lesson["attempts_to_advance"] or 0), reverse=True)
+
+        commands = []
+        for name, stats in self.commands.items():
+            commands.append(dict(stats, command=name, avg_ms=stats["total_ms"] / stats["count"]))
+        blocked = sorted(commands, key=lambda c: c["blocked_ai"] + c["blocked_safety"], reverse=True)
+        fallbacks = sorted(commands, key=lambda c: c["fallbacks"], reverse=True)
+
+        return {
+            "totals": dict(self.totals),
+            "chapters": chapters,
+            "lessons": lessons[:top],
+            "most_blocked": [c for c in blocked[:top] if c["blocked_ai"] + c["blocked_safety"]],
+            "most_fallbacks": [c for c in fallbacks[:top] if c["fallbacks"]]
+        }
+
+
+def _bucket(milliseconds: float) -> int:
+    for slot, bound in enumerate(LATENCY_BUCKETS_MS):
+        if milliseconds <= bound:
+            return slot
+    return len(LATENCY_BUCKETS_MS)
+
+
+def _chapter_order(key: str):
+    return (0, int(key)) if key.isdigit() else (1, key)
+
+
+def aggregate_set(files: Sequence[Path]) -> Aggregates:
+    """Worker entry point: aggregate one log set"""
+    aggregates = Aggregates()
+    aggregates.add_set(files)
+    return aggregates
+
+
+def analyze(paths: Sequence[Path], workers: int = 1) -> Aggregates:
+    """Aggregate every log set under paths, in parallel across sets if workers > 1"""
+    log_sets = find_log_sets(paths)
+    total = Aggregates()
+    if workers > 1 and len(log_sets) > 1:
+        with Pool(min(workers, len(log_sets))) as pool:
+            # Results stream back and are merged as they finish, one set at a time
+            for aggregates in pool.imap_unordered(aggregate_set, log_sets):
+                total.merge(aggregates)
+    else:
+        for files in log_sets:
+            total.add_set(files)
+    return total
+
+
+def print_report(report: Dict[str, Any]):
+    totals = report["totals"]
+    print(f"[ANALYTICS] {totals['files']} file(s), {totals['events']} events, {totals['commands']} commands"
+          + (f", {totals['bad_lines']} unreadable line(s)" if totals['bad_lines'] else ""))
+
+    print(f"\n{'chapter':<10}{'commands':>10}{'blocked':>9}{'fallback':>10}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'analysis':>10}{'safety':>8}{'exec':>8}{'story':>8}")
+    for chapter, stats in report["chapters"].items():
+        stages = stats["stage_avg_ms"]
+        print(f"{chapter:<10}{stats['commands']:>10}{stats['blocked']:>9}{stats['fallbacks']:>10}"
+              f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stages['analysis']:>10.1f}{stages['safety']:>8.1f}"
+              f"{stages['execution']:>8.1f}{stages['story']:>8.1f}")
+
+    print(f"\n{'lesson (most stalled first)':<34}{'learners':>9}{'stalled':>9}{'tries':>7}{'secs':>8}")
+    for lesson in report["lessons"]:
+        tries = f"{lesson['attempts_to_advance']:.1f}" if lesson["attempts_to_advance"] is not None else "-"
+        secs = f"{lesson['seconds_to_advance']:.0f}" if lesson["seconds_to_advance"] is not None else "-"
+        name = f"{lesson['chapter']}/{lesson['lesson']}"[:32]
+        print(f"{name:<34}{lesson['learners']:>9}{lesson['stalled']:>9}{tries:>7}{secs:>8}")
+
+    print(f"\n{'most blocked':<20}{'count':>8}{'by AI':>8}{'by rules':>10}")
+    for command in report["most_blocked"]:
+        print(f"{command['command']:<20}{command['count']:>8}{command['blocked_ai']:>8}{command['blocked_safety']:>10}")
+
+    print(f"\n{'most fallbacks':<20}{'count':>8}{'fallbacks':>11}")
+    for command in report["most_fallbacks"]:
+        print(f"{command['command']:<20}{command['count']:>8}{command['fallbacks']:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Aggregate Terminal Quest event logs across learners')
+    parser.add_argument('paths', nargs='+', type=Path,
+                        help='Log files or directories (rotated .N and .N.gz files are included)')
+    parser.add_argument('--workers', type=int, default=1, help='Processes to read log sets with')
+    parser.add_argument('--top', type=int, default=20, help='Rows in the lesson and command tables')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    report = analyze(args.paths, args.workers).report(args.top)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
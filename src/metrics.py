@@ -0,0 +1,231 @@
+"""
+Metrics for Terminal Quest: Remastered
+Process-wide counters and latency histograms for each stage of a command
+(AI analysis, safety rules, execution, story), exported as a JSON snapshot
+and a Prometheus text file
+"""
+
+import bisect
+import functools
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+from progress import write_atomically
+
+# Upper bounds in seconds, from a cached verdict to a slow model on a lab machine
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DEFAULT_INTERVAL = 15.0
+
+
+def bucket_quantile(buckets: Sequence[float], counts: Sequence[int], q: float) -> float:
+    """
+    Estimate a quantile from bucket counts (one per upper bound, plus a final
+    overflow count) by interpolating inside the bucket it falls in
+    """
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for slot, count in enumerate(counts):
+        if count and seen + count >= rank:
+            if slot == len(buckets):
+                return buckets[-1]
+            lower = buckets[slot - 1] if slot else 0.0
+            return lower + (buckets[slot] - lower) * (rank - seen) / count
+        seen += count
+    return buckets[-1]
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
+
+    def get_stats(self) -> int:
+        return self.value
+
+
+class Histogram:
+    """Fixed-bucket latency histogram: observing is a bisect and two additions"""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # One slot per bucket plus the +Inf overflow
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[slot] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def time(self, func):
+        """Decorator: observe how long each call takes"""
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.observe(time.perf_counter() - start)
+        return timed
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside its bucket"""
+        with self._lock:
+            counts = list(self.counts)
+        return bucket_quantile(self.buckets, counts, q)
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            count, total = self.count, self.sum
+        return {
+            "count": count,
+            "sum": total,
+            "avg_ms": total / count * 1000 if count else 0.0,
+            "p50_ms": self.quantile(0.5) * 1000,
+            "p95_ms": self.quantile(0.95) * 1000,
+            "p99_ms": self.quantile(0.99) * 1000
+        }
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = "terminal_quest_"):
+        self.prefix = prefix
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def _get(self, cls, name: str, *args):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args)
+            return metric
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        """The counter with this name, created on first request"""
+        return self._get(Counter, name, help_text)
+
+    def histogram(self, name: str, help_text: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """The histogram with this name, created on first request"""
+        return self._get(Histogram, name, help_text, buckets)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Every metric's current value (counters) or summary (histograms)"""
+        with self._lock:
+            metrics = dict(self.metrics)
+        return {
+            "time": time.time(),
+            "uptime": time.time() - self.started,
+            "counters": {name: m.get_stats() for name, m in metrics.items() if isinstance(m, Counter)},
+            "histograms": {name: m.get_stats() for name, m in metrics.items() if isinstance(m, Histogram)}
+        }
+
+    def to_prometheus(self) -> str:
+        """The Prometheus text exposition format, e.g. for node_exporter's textfile collector"""
+        with self._lock:
+            metrics = sorted(self.metrics.items())
+        lines = []
+        for name, metric in metrics:
+            full_name = self.prefix + name
+            if metric.help:
+                lines.append(f"# HELP {full_name} {metric.help}")
+            if isinstance(metric, Counter):
+                lines.append(f"# TYPE {full_name} counter")
+                lines.append(f"{full_name} {metric.value}")
+                continue
+
+            lines.append(f"# TYPE {full_name} histogram")
+            with metric._lock:
+                counts, total, count = list(metric.counts), metric.sum, metric.count
+            cumulative = 0
+            for bound, bucket_count in zip(metric.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{full_name}_bucket{{le="{bound:g}"}} {cumulative}')
+            lines.append(f'{full_name}_bucket{{le="+Inf"}} {count}')
+            lines.append(f"{full_name}_sum {total:.6f}")
+            lines.append(f"{full_name}_count {count}")
+        return "\n".join(lines) + "\n"
+
+    def format_summary(self) -> str:
+        snapshot = self.snapshot()
+        lines = [f"{'stage':<24}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}"]
+        for name, stats in sorted(snapshot["histograms"].items()):
+            lines.append(f"{name:<24}{stats['count']:>8}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}")
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"{name}: {value}")
+        return "\n".join(lines)
+
+
+class MetricsExporter:
+    """Writes the registry to a JSON snapshot and/or Prometheus text file every interval seconds"""
+
+    def __init__(self, registry: MetricsRegistry, json_file: Optional[Path] = None,
+                 prometheus_file: Optional[Path] = None, interval: float = DEFAULT_INTERVAL):
+        self.registry = registry
+        self.json_file = Path(json_file).expanduser() if json_file else None
+        self.prometheus_file = Path(prometheus_file).expanduser() if prometheus_file else None
+        self.interval = max(1.0, interval)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, registry: MetricsRegistry, config: Dict[str, Any]) -> Optional["MetricsExporter"]:
+        """Build from the 'metrics' block of config.json; None if no output file is set"""
+        settings = config.get('metrics', {})
+        if not settings.get('json_file') and not settings.get('prometheus_file'):
+            return None
+        return cls(registry, settings.get('json_file'), settings.get('prometheus_file'),
+                   settings.get('interval', DEFAULT_INTERVAL))
+
+    def write(self):
+        # Atomic replace: the node exporter must never scrape a half-written file
+        if self.json_file:
+            write_atomically(self.json_file, json.dumps(self.registry.snapshot(), indent=2).encode())
+        if self.prometheus_file:
+            write_atomically(self.prometheus_file, self.registry.to_prometheus().encode())
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                print(f"[METRICS] Could not write metrics: {e}")
+
+    def stop(self):
+        """Stop the background writes and write a final snapshot"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.write()
+        except OSError as e:
+            print(f"[METRICS] Could not write metrics: {e}")
+
+
+# Shared by every subsystem (and every session of the session server)
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,101 @@
+"""
+Pacing for Terminal Quest: Remastered
+One place for every dramatic pause and "press any key" wait, so the story
+can be slowed down, sped up, or run headless with no waiting at all
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Seconds for each named effect at a time scale of 1.0
+DEFAULT_DURATIONS = {
+    "boot": 2.0,             # "SYSTEM INITIALIZING..." banner
+    "loading_dot": 1.0,      # each dot of the loading sequence
+    "launch_countdown": 3.0  # chance to cancel before the tutorial starts
+}
+
+
+class Pacing:
+    def __init__(self, time_scale: float = 1.0, durations: Optional[Dict[str, float]] = None,
+                 headless: bool = False):
+        """
+        Args:
+            time_scale: Multiplier for every delay (0 skips them, 2 doubles them)
+            durations: Per-effect overrides for DEFAULT_DURATIONS; an entry also
+                overrides the seconds a caller asks for (e.g. "section_pause")
+            headless: Skip all delays and key waits (automated runs, demos, tests)
+        """
+        self.time_scale = max(0.0, float(time_scale))
+        self.durations = dict(DEFAULT_DURATIONS)
+        self.overrides = dict(durations or {})
+        self.durations.update(self.overrides)
+        self.headless = headless
+
+        self.slept = 0.0
+        self.skipped = 0.0
+        self.keys_skipped = 0
+        # Seconds spent in delays and key waits, per thread (sessions share one Pacing)
+        self._waits = threading.local()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], headless: Optional[bool] = None,
+                    time_scale: Optional[float] = None) -> "Pacing":
+        """Build from the 'pacing' block of config.json; explicit arguments win"""
+        settings = config.get('pacing', {})
+        return cls(
+            time_scale=settings.get('time_scale', 1.0) if time_scale is None else time_scale,
+            durations=settings.get('durations'),
+            headless=settings.get('headless', False) if headless is None else headless
+        )
+
+    @property
+    def waited(self) -> float:
+        """Seconds this thread has spent pausing or waiting for a key, to leave out of latency timings"""
+        return getattr(self._waits, "seconds", 0.0)
+
+    def read_keys_with(self, reader: Optional[Callable[[], str]]):
+        """Have this thread's key waits call reader() instead of input() (None: back to input)"""
+        self._waits.key_reader = reader
+
+    def _record_wait(self, start: float):
+        self._waits.seconds = self.waited + (time.perf_counter() - start)
+
+    def duration(self, effect: str, seconds: Optional[float] = None) -> float:
+        """Scaled length of an effect, after any configured override"""
+        if effect in self.overrides or seconds is None:
+            seconds = self.durations.get(effect, 0.0)
+        return seconds * self.time_scale
+
+    def delay(self, effect: str, seconds: Optional[float] = None):
+        """Pause for a named effect (or the given seconds, scaled)"""
+        duration = self.duration(effect, seconds)
+        if duration <= 0:
+            return
+        if self.headless:
+            self.skipped += duration
+            return
+        start = time.perf_counter()
+        time.sleep(duration)
+        self._record_wait(start)
+        self.slept += duration
+
+    def wait_for_key(self, message: str = "Press any key to continue...") -> bool:
+        """
+        Wait for Enter, or carry straight on when headless
+
+        Returns:
+            bool: False if the learner pressed Ctrl+C instead
+        """
+        print(f"\n{message}")
+        if self.headless:
+            self.keys_skipped += 1
+            return True
+        start = time.perf_counter()
+        try:
+            (getattr(self._waits, "key_reader", None) or input)()
+        except KeyboardInterrupt:
+            return False
+        finally:
+            self._record_wait(start)
+        return True
@@ -0,0 +1,160 @@
+"""
+Path Index for Terminal Quest: Remastered
+An index of the executables on PATH plus the shell's builtins, so a typo
+like 'sl' is caught (with a suggestion) before it costs an AI call or a
+shell. The index is rebuilt only when PATH or one of its directories changes.
+"""
+
+import difflib
+import os
+import shlex
+import threading
+import time
+from pathlib import Path
+from typing import FrozenSet, List, Optional, Tuple
+
+from command_kb import KNOWLEDGE_BASE
+
+# Commands run through /bin/sh; these never appear on PATH
+SHELL_BUILTINS = frozenset({
+    ".", ":", "[", "alias", "bg", "break", "cd", "command", "continue", "echo", "eval", "exec", "exit",
+    "export", "false", "fg", "getopts", "hash", "jobs", "kill", "printf", "pwd", "read", "readonly",
+    "return", "set", "shift", "source", "test", "times", "trap", "true", "type", "ulimit", "umask",
+    "unalias", "unset", "wait",
+    # Shell keywords that can start a command (or follow a ';' in a compound one)
+    "case", "do", "done", "elif", "else", "esac", "fi", "for", "function", "if", "in", "select", "then",
+    "until", "while", "{", "}", "!"
+})
+# Tokens that end one command and start the next
+SEPARATORS = frozenset({"|", "||", "&", "&&", ";", ";;", "(", ")", "|&"})
+# How often (seconds) PATH directories are re-checked for changes
+CHECK_INTERVAL = 1.0
+
+
+class PathIndex:
+    def __init__(self, path: Optional[str] = None, builtins: FrozenSet[str] = SHELL_BUILTINS,
+                 taught: FrozenSet[str] = KNOWLEDGE_BASE.known, check_interval: float = CHECK_INTERVAL):
+        """
+        Args:
+            path: PATH to index (defaults to the environment's, re-read on each check)
+            builtins: Names the shell runs itself
+            taught: Commands the story asks for; never reported, so a machine
+                without one (e.g. no lspci) can't stall the story
+        """
+        self.path = path
+        self.builtins = frozenset(builtins)
+        self.taught = frozenset(taught)
+        self.check_interval = check_interval
+        self.executables: FrozenSet[str] = frozenset()
+        self.stamps: Tuple[Tuple[str, int], ...] = ()
+        self.checked = None
+        self.rebuilds = 0
+        self._lock = threading.Lock()
+
+    def _directories(self) -> List[str]:
+        value = self.path if self.path is not None else os.environ.get("PATH", os.defpath)
+        directories = []
+        for directory in value.split(os.pathsep):
+            # An empty entry means the current directory; commands there need ./ in our shell anyway
+            if directory and directory not in directories:
+                directories.append(directory)
+        return directories
+
+    def refresh(self, force: bool = False):
+        """Rebuild the index if PATH or any of its directories changed (checked at most every check_interval)"""
+        now = time.monotonic()
+        if not force and self.checked is not None and now - self.checked < self.check_interval:
+            return
+        with self._lock:
+            self.checked = now
+            directories = self._directories()
+            stamps = []
+            for directory in directories:
+                try:
+                    stamps.append((directory, os.stat(directory).st_mtime_ns))
+                except OSError:
+                    stamps.append((directory, 0))
+            stamps = tuple(stamps)
+            if not force and stamps == self.stamps:
+                return
+
+            executables = set()
+            for directory, mtime in stamps:
+                if not mtime:
+                    continue
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if entry.name not in executables and entry.is_file() and os.access(entry.path, os.X_OK):
+                                executables.add(entry.name)
+                except OSError:
+                    continue
+            self.executables = frozenset(executables)
+            self.stamps = stamps
+            self.rebuilds += 1
+
+    def __contains__(self, name: str) -> bool:
+        self.refresh()
+        return name in self.builtins or name in self.executables
+
+    def unknown_commands(self, command: str, current_dir: Optional[str] = None) -> List[str]:
+        """
+        Programs in a command line that the shell wouldn't find
+
+        Every command of a pipeline or chain is checked. Anything the index
+        can't judge (unbalanced quotes, expansions, paths that exist) is
+        assumed to be fine and left to the shell.
+        """
+        try:
+            lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+            lexer.whitespace_split = True
+            tokens = list(lexer)
+        except ValueError:
+            return []
+
+        unknown = []
+        expect_command = True
+        redirect_target = False
+        for token in tokens:
+            if token in SEPARATORS or set(token) <= set("|&;()"):
+                expect_command = True
+                continue
+            if not expect_command:
+                continue
+            # Leading VAR=value assignments and redirections belong to the command that follows
+            if redirect_target:
+                redirect_target = False
+                continue
+            if token[0] in "<>":
+                redirect_target = True
+                continue
+            if "=" in token.split("/")[0] and token[0] not in "=/." or token.isdigit():
+                continue
+            expect_command = False
+            if any(char in token for char in "$`*?[~"):
+                continue
+            if "/" in token:
+                path = Path(current_dir or ".") / token
+                if not path.exists():
+                    unknown.append(token)
+                continue
+            if token not in self.taught and token not in self and token not in unknown:
+                unknown.append(token)
+        return unknown
+
+    def suggestions(self, name: str, limit: int = 3) -> List[str]:
+        """Close matches for a mistyped command, preferring ones the game teaches"""
+        # Swapped letters ('sl') score low with difflib, so same-letter commands come first
+        letters = sorted(name)
+        swapped = sorted(command for command in self.taught if sorted(command) == letters)
+        close = difflib.get_close_matches(name, self.taught, n=limit, cutoff=0.6)
+        taught = (swapped + [match for match in close if match not in swapped])[:limit]
+        if len(taught) >= limit:
+            return taught
+        self.refresh()
+        others = difflib.get_close_matches(name, self.builtins | self.executables, n=limit, cutoff=0.75)
+        return (taught + [match for match in others if match not in taught])[:limit]
+
+
+# Shared by every session; PATH is the same for all of them
+PATH_INDEX = PathIndex()
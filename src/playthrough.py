@@ -0,0 +1,232 @@
+"""
+Playthrough Runner for Terminal Quest: Remastered
+Feeds a transcript of inputs through TerminalQuest with no TTY (mock AI,
+temporary sandbox, headless pacing) and times every stage of each step
+"""
+
+import argparse
+import contextlib
+import functools
+import io
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from event_log import EventLog
+from main import TerminalQuest
+from session_server import SharedResources, percentile, story_commands
+
+STAGES = ("analysis", "safety", "execution", "story")
+DEFAULT_BASELINE = Path(__file__).parent / "playthrough_baseline.json"
+# A stage only counts as regressed past both limits, so tiny timings don't flap
+DEFAULT_TOLERANCE = 0.5
+MIN_REGRESSION_MS = 5.0
+
+
+def story_transcript(engine) -> List[Dict[str, Any]]:
+    """The commands the story waits for, in order, each expected to fire its trigger"""
+    return [{"input": command, "trigger": True} for command in story_commands(engine)]
+
+
+def load_transcript(path: Path) -> List[Dict[str, Any]]:
+    """
+    Read a transcript: a JSON list of inputs, either plain strings or
+    {"input": ..., "trigger": true/false} to assert the story did (not) advance
+    """
+    with open(path, 'r') as f:
+        steps = json.load(f)
+    return [step if isinstance(step, dict) else {"input": step} for step in steps]
+
+
+class StageTimer:
+    """Wraps a game object's method so each call adds to the current step's stage time"""
+
+    def __init__(self):
+        self.current = None
+
+    def wrap(self, obj, name: str, stage: str):
+        original = getattr(obj, name)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                if self.current is not None:
+                    self.current[stage] += time.perf_counter() - start
+
+        setattr(obj, name, timed)
+
+
+class PlaythroughRunner:
+    def __init__(self, transcript: Optional[List[Dict[str, Any]]] = None, mock_ai_latency: float = 0.0):
+        self.transcript = transcript
+        self.mock_ai_latency = mock_ai_latency
+
+    def _new_game(self, home_dir: Path) -> TerminalQuest:
+        shared = SharedResources(mock_ai_latency=self.mock_ai_latency)
+        shared.pacing.headless = True
+        if shared.event_log is not None:
+            # Keep the logging cost in the timings, but not the log
+            shared.event_log = EventLog(home_dir / "events.jsonl")
+
+        return TerminalQuest(shared=shared, home_dir=home_dir, session_id="playthrough")
+
+    def run_once(self) -> Dict[str, Any]:
+        """
+        Play the transcript once in a fresh sandbox
+
+        Returns:
+            dict: steps (per-stage seconds, trigger result) and the game output
+        """
+        home_dir = Path(tempfile.mkdtemp(prefix="terminal_quest_playthrough-"))
+        output = io.StringIO()
+        steps = []
+        try:
+            with contextlib.redirect_stdout(output):
+                game = self._new_game(home_dir)
+                story = game.story_manager
+                transcript = self.transcript if self.transcript is not None else story_transcript(story.engine)
+
+                timer = StageTimer()
+                timer.wrap(game.ai_analyzer, "analyze_command", "analysis")
+                timer.wrap(game.safety_system, "is_command_safe", "safety")
+                timer.wrap(game.resource_limiter, "run", "execution")
+                timer.wrap(game, "change_directory", "execution")
+                timer.wrap(story, "check_command_trigger", "story")
+
+                current_dir = game.setup_game_environment()
+                start = time.perf_counter()
+                game.begin_story()
+                startup = time.perf_counter() - start
+
+                for step in transcript:
+                    command = step["input"]
+                    record = dict.fromkeys(STAGES, 0.0)
+                    record.update(input=command, expected_trigger=step.get("trigger"))
+                    timer.current = record
+                    position = story.position
+
+                    start = time.perf_counter()
+                    # Same path as TerminalQuest.game_loop
+                    result, current_dir = game.execute_command(command, current_dir)
+                    if result is not None:
+                        game.check_story(command, result)
+                    game.log_command_event()
+                    record["total"] = time.perf_counter() - start
+
+                    timer.current = None
+                    record["blocked"] = result is None
+                    record["triggered"] = story.position != position
+                    steps.append(record)
+
+                game.progress.close()
+                if game.event_log is not None:
+                    game.event_log.close()
+        finally:
+            shutil.rmtree(home_dir, ignore_errors=True)
+
+        return {"startup": startup, "steps": steps, "output": output.getvalue(), "render": game.renderer.get_stats()}
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """p50/p95/max in milliseconds for each stage and the whole step"""
+    summary = {}
+    for stage in STAGES + ("total",):
+        values = [step[stage] * 1000 for run in runs for step in run["steps"]]
+        if values:
+            summary[stage] = {"p50": percentile(values, 50), "p95": percentile(values, 95), "max": max(values)}
+    startups = [run["startup"] * 1000 for run in runs]
+    summary["startup"] = {"p50": percentile(startups, 50), "p95": percentile(startups, 95), "max": max(startups)}
+    return summary
+
+
+def trigger_failures(runs: List[Dict[str, Any]]) -> List[str]:
+    """Steps whose story trigger didn't behave as the transcript expected"""
+    failures = []
+    for number, run in enumerate(runs, 1):
+        for step in run["steps"]:
+            expected = step["expected_trigger"]
+            if expected is None or expected == step["triggered"]:
+                continue
+            why = "was blocked" if step["blocked"] else ("did not fire" if expected else "fired unexpectedly")
+            failures.append(f"run {number}: '{step['input']}' {why}")
+    return failures
+
+
+def check_baseline(summary: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                   tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """p95 regressions against a stored baseline"""
+    regressions = []
+    for stage, stats in summary.items():
+        if stage not in baseline:
+            continue
+        before, now = baseline[stage]["p95"], stats["p95"]
+        if now > before * (1 + tolerance) and now - before > MIN_REGRESSION_MS:
+            regressions.append(f"{stage}: p95 {now:.1f}ms vs baseline {before:.1f}ms")
+    return regressions
+
+
+def print_summary(summary: Dict[str, Dict[str, float]], runs: List[Dict[str, Any]]):
+    steps = sum(len(run["steps"]) for run in runs)
+    print(f"[PLAYTHROUGH] {len(runs)} run(s), {steps} steps")
+    print(f"{'stage':<10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for stage in ("startup",) + STAGES + ("total",):
+        if stage in summary:
+            stats = summary[stage]
+            print(f"{stage:<10}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['max']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play a transcript through Terminal Quest and time each stage')
+    parser.add_argument('--transcript', type=Path, help='JSON list of inputs (default: the story\'s expected commands)')
+    parser.add_argument('--runs', type=int, default=3, help='Number of fresh playthroughs')
+    parser.add_argument('--ai-latency', type=float, default=0.0, help='Mock AI latency in seconds')
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE, help='Stored p95 baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='Allowed p95 growth (0.5 = +50%%)')
+    parser.add_argument('--update-baseline', action='store_true', help='Store this run as the new baseline')
+    parser.add_argument('--show-output', action='store_true', help='Print the game output of the last run')
+    args = parser.parse_args()
+
+    transcript = load_transcript(args.transcript) if args.transcript else None
+    runner = PlaythroughRunner(transcript, args.ai_latency)
+    runs = [runner.run_once() for _ in range(max(1, args.runs))]
+    summary = summarize(runs)
+    print_summary(summary, runs)
+
+    render = runs[-1]["render"]
+    print(f"[PLAYTHROUGH] Rendering: {render['frames']} frames, {render['bytes']} bytes, "
+          f"{render['avg_frame_ms']:.3f}ms per frame")
+
+    if args.show_output:
+        print(runs[-1]["output"])
+
+    failed = False
+    for failure in trigger_failures(runs):
+        print(f"[PLAYTHROUGH] Story trigger: {failure}")
+        failed = True
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"[PLAYTHROUGH] Baseline written to {args.baseline}")
+    elif args.baseline.exists():
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        for regression in check_baseline(summary, baseline, args.tolerance):
+            print(f"[PLAYTHROUGH] Regression: {regression}")
+            failed = True
+    else:
+        print(f"[PLAYTHROUGH] Warning: no baseline at {args.baseline}, so p95 regressions were not checked "
+              f"(record one with --update-baseline)")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Policy Profiles for Terminal Quest: Remastered
+Which checks a command goes through before it runs, in what order and how
+strictly, for each way the game is played (the tutorial, safe mode after
+it, an instructor's session). Profiles are compiled once; deciding what a
+command needs is a set lookup, and each profile's cost is recorded in the
+metrics registry.
+"""
+
+from typing import Any, Dict, Optional, Sequence
+
+from command_kb import KNOWLEDGE_BASE, MAX_LEVEL, SHELL_SYNTAX, CommandKnowledgeBase, base_command
+from metrics import REGISTRY
+
+CHECKS = ("known", "rules", "ai")
+
+# name -> settings; see PolicyProfile for what each one means
+PROFILES = {
+    # The cheap checks run first: a command they block never costs a model call
+    "tutorial": {"checks": ("known", "rules", "ai"), "level": None, "trust_known": False, "relaxed": False},
+    # Everything has been taught, so plain commands the game knows skip the AI
+    # (except look-only and file-changing ones, see PolicyProfile)
+    "safe": {"checks": ("known", "rules", "ai"), "level": MAX_LEVEL, "trust_known": True, "relaxed": True},
+    # For instructors trying out content: the safety rules only, no model needed
+    "instructor": {"checks": ("known", "rules"), "level": MAX_LEVEL, "trust_known": True, "relaxed": True}
+}
+DEFAULT_PROFILES = {"tutorial": "tutorial", "safe_mode": "safe"}
+
+
+class PolicyProfile:
+    def __init__(self, name: str, checks: Sequence[str], level: Optional[int] = None, trust_known: bool = False,
+                 relaxed: bool = False, knowledge: CommandKnowledgeBase = KNOWLEDGE_BASE):
+        """
+        Args:
+            checks: "known" (the program exists), "rules" (safety rules) and/or "ai" (the analyzer),
+                run in this order
+            level: Learner level the AI judges against (None: the game's progress)
+            trust_known: Don't ask the AI about plain commands taught by that level, other than
+                look-only (systemctl, journalctl) and file-changing ones (chmod, rm...)
+            relaxed: Word blocks for a learner who finished the tutorial
+        """
+        unknown = [check for check in checks if check not in CHECKS]
+        if unknown:
+            raise ValueError(f"Unknown policy check(s) {', '.join(unknown)} (expected: {', '.join(CHECKS)})")
+        self.name = name
+        self.checks = tuple(checks)
+        self.level = level
+        self.relaxed = relaxed
+        self.uses_ai = "ai" in self.checks
+        self.trusted = frozenset()
+        if trust_known and level is not None:
+            # These are only safe with the right arguments, so they are always checked in full
+            untrusted = set(knowledge.read_only) | set(knowledge.read_only_verbs) | knowledge.file_commands
+            self.trusted = knowledge.allowed_at(level) - untrusted
+
+        self.decision_time = REGISTRY.histogram(f"policy_{name}_seconds",
+                                                f"Time the {name} profile spends deciding whether a command may run")
+        self.ai_calls = REGISTRY.counter(f"policy_{name}_ai_calls_total", f"Commands the {name} profile asked the AI about")
+        self.ai_skipped = REGISTRY.counter(f"policy_{name}_ai_skipped_total",
+                                           f"Commands the {name} profile trusted without asking the AI")
+
+    def level_for(self, game_progress: int) -> int:
+        return game_progress if self.level is None else self.level
+
+    def wants_ai(self, command: str) -> bool:
+        """Whether this command needs the AI's verdict under this profile"""
+        if not self.uses_ai:
+            return False
+        if base_command(command) in self.trusted and not SHELL_SYNTAX.search(command):
+            self.ai_skipped.inc()
+            return False
+        self.ai_calls.inc()
+        return True
+
+    def __repr__(self):
+        return f"<PolicyProfile {self.name}: {' -> '.join(self.checks)}>"
+
+
+# Compiled once and shared by every session
+POLICIES = {name: PolicyProfile(name, **settings) for name, settings in PROFILES.items()}
+
+
+def select_policies(config: Dict[str, Any], override: Optional[str] = None) -> Dict[str, PolicyProfile]:
+    """
+    The profiles for the tutorial and for safe mode, from the 'policy' block of config.json
+
+    Args:
+        override: A profile name to use for both (e.g. from --policy)
+    """
+    settings = dict(DEFAULT_PROFILES, **config.get('policy', {}))
+    if override is not None:
+        settings = dict.fromkeys(DEFAULT_PROFILES, override)
+    selected = {}
+    for mode, name in settings.items():
+        if name not in POLICIES:
+            raise ValueError(f"Unknown policy profile '{name}' for {mode} (expected one of: {', '.join(POLICIES)})")
+        selected[mode] = POLICIES[name]
+    return selected
@@ -0,0 +1,201 @@
+"""
+Live Profiler for Terminal Quest: Remastered
+Profiles a running game on request ("__profile" at the prompt, or SIGUSR1),
+with cProfile or a sampling profiler, and writes the results when stopped.
+Nothing is hooked or running while it is off.
+"""
+
+import io
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+MODES = ("sample", "cprofile")
+DEFAULT_INTERVAL = 0.005
+TOP_ENTRIES = 15
+# Leaf frames of threads parked waiting for work (AI workers, the metrics
+# exporter, executor threads) or for the learner (the prompt, key waits, a
+# session's socket); left out so samples show where time is actually spent
+IDLE_FRAMES = {"threading:Condition.wait", "threading:Event.wait", "queue:Queue.get", "threading:Thread.join",
+               "thread:_worker", "main:TerminalQuest.read_input", "pacing:Pacing.wait_for_key",
+               "async_repl:AsyncREPL.read_input.<locals>.reader", "socket:SocketIO.readinto"}
+# Callers whose selector wait means there is nothing to do (the blocking
+# REPL's wait on a running command's output is real latency, so it stays)
+IDLE_SELECT_CALLERS = {"base_events:BaseEventLoop._run_once", "socketserver:BaseServer.serve_forever"}
+
+
+def default_output_dir() -> Path:
+    cache_home = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    return cache_home / "terminal_quest" / "profiles"
+
+
+def is_idle(stack: str) -> bool:
+    """Whether a collapsed stack is a thread waiting for work or input"""
+    frames = stack.rsplit(";", 2)
+    if frames[-1] in IDLE_FRAMES:
+        return True
+    return frames[-1].startswith("selectors:") and len(frames) > 2 and frames[-2] in IDLE_SELECT_CALLERS
+
+
+def collapse_stack(frame, thread_name: str) -> str:
+    """A frame's call stack in the collapsed format flame graph tools read (root first)"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{Path(code.co_filename).stem}:{getattr(code, 'co_qualname', code.co_name)}")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    Samples every thread's stack at a fixed interval from a background thread
+
+    Unlike cProfile it sees all threads (e.g. the async REPL's workers) and
+    the profiled code runs at full speed between samples.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = collapse_stack(frame, names.get(ident, str(ident)))
+                if not is_idle(stack):
+                    self.stacks[stack] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: Path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def summary(self) -> List[str]:
+        """Functions with the most samples on top of the stack (self time) and anywhere on it"""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+
+        lines = [f"{self.samples} samples every {self.interval * 1000:g}ms",
+                 f"{'self %':>7}{'total %':>9}  function"]
+        all_samples = sum(self.stacks.values()) or 1
+        for name, count in own.most_common(TOP_ENTRIES):
+            lines.append(f"{count / all_samples * 100:>7.1f}{total[name] / all_samples * 100:>9.1f}  {name}")
+        return lines
+
+
+class LiveProfiler:
+    def __init__(self, output_dir: Optional[Path] = None, interval: float = DEFAULT_INTERVAL):
+        self.output_dir = Path(output_dir) if output_dir else default_output_dir()
+        self.interval = interval
+        self.mode = None
+        self.started = None
+        self._profiler = None
+
+    @property
+    def active(self) -> bool:
+        return self.mode is not None
+
+    def start(self, mode: str = "sample"):
+        """
+        Start profiling
+
+        "cprofile" traces every call, but only on the thread that starts it
+        (the game loop); "sample" sees every thread at a fraction of the cost.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiler mode '{mode}' (expected one of: {', '.join(MODES)})")
+        if self.active:
+            return
+        if mode == "cprofile":
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler = SamplingProfiler(self.interval)
+            self._profiler.start()
+        self.mode = mode
+        self.started = time.perf_counter()
+
+    def stop(self) -> Tuple[Optional[Path], List[str]]:
+        """
+        Stop profiling and write the results
+
+        Returns:
+            tuple: (file written: .pstats for cProfile, .collapsed stacks for
+            flame graphs when sampling; summary lines of the hottest functions)
+        """
+        if not self.active:
+            return None, []
+        elapsed = time.perf_counter() - self.started
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+
+        if self.mode == "cprofile":
+            self._profiler.disable()
+            import pstats
+            path = self.output_dir / f"profile-{stamp}-{os.getpid()}.pstats"
+            self._profiler.dump_stats(path)
+            report = io.StringIO()
+            pstats.Stats(self._profiler, stream=report).sort_stats("cumulative").print_stats(TOP_ENTRIES)
+            summary = [line for line in report.getvalue().splitlines() if line.strip()]
+        else:
+            self._profiler.stop()
+            path = self.output_dir / f"profile-{stamp}-{os.getpid()}.collapsed"
+            self._profiler.write(path)
+            summary = self._profiler.summary()
+
+        self.mode = None
+        self._profiler = None
+        return path, [f"{elapsed:.1f}s profiled"] + summary
+
+    def toggle(self, mode: str = "sample") -> Tuple[Optional[Path], List[str]]:
+        """Start if stopped (nothing to report yet), stop and report if running"""
+        if self.active:
+            return self.stop()
+        self.start(mode)
+        return None, []
+
+    def install_signal_handler(self, report, signum: int = getattr(signal, "SIGUSR1", 0)):
+        """
+        Toggle sampling on a signal (`kill -USR1 <pid>`); main thread only
+
+        Args:
+            report: Called with (path, summary lines) when a run stops
+        """
+        if not signum or threading.current_thread() is not threading.main_thread():
+            return
+
+        def on_signal(received, frame):
+            path, summary = self.toggle()
+            report(path, summary)
+
+        signal.signal(signum, on_signal)
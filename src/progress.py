@@ -0,0 +1,209 @@
+"""
+Progress Store for Terminal Quest: Remastered
+Saves story progress as small events appended to a journal, folded into a
+snapshot every so often, so a restart resumes where the learner left off
+"""
+
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+SNAPSHOT_VERSION = 1
+
+
+def write_atomically(path: Path, data: bytes):
+    """Replace a file so readers see either the old or the new contents, even after a crash"""
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+    # Make the rename itself durable
+    try:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+class ProgressStore:
+    """
+    Journal + snapshot persistence for one learner's story progress
+
+    Each event is written to the journal straight away (so a crash of the
+    game loses nothing), but fsync'd in batches: after sync_every events or
+    sync_interval seconds, and on close. After compact_every events the state
+    is written as a snapshot and the journal starts over.
+    """
+
+    def __init__(self, save_file: Path, sync_every: int = 8, sync_interval: float = 2.0,
+                 compact_every: int = 64):
+        self.save_file = Path(save_file)
+        self.journal_file = self.save_file.with_suffix(".journal")
+        self.sync_every = max(1, sync_every)
+        self.sync_interval = sync_interval
+        self.compact_every = max(1, compact_every)
+
+        self.state = self._empty_state()
+        self.seq = 0
+        self.journal = None
+        self.journal_events = 0
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    @staticmethod
+    def _empty_state() -> Dict[str, Any]:
+        return {"position": None, "lesson_context": None, "expecting_command": None, "commands_learned": []}
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """
+        Rebuild the saved state from the snapshot plus any newer journal events
+
+        Returns:
+            dict: position, lesson_context, expecting_command and
+            commands_learned, or None if nothing has been saved
+        """
+        self.state = self._empty_state()
+        self.seq = 0
+        self.journal_events = 0
+        found = False
+
+        try:
+            with open(self.save_file, 'r') as f:
+                snapshot = json.load(f)
+            if snapshot.get("version") == SNAPSHOT_VERSION:
+                self.state.update(snapshot.get("state", {}))
+                self.seq = snapshot.get("seq", 0)
+                found = True
+        except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+            pass
+
+        events, torn = self._read_journal()
+        for event in events:
+            # Events already folded into the snapshot (a crash between the
+            # snapshot and the journal reset) are skipped by sequence number
+            if event.get("s", 0) <= self.seq:
+                continue
+            self._apply(event)
+            self.seq = event["s"]
+            self.journal_events += 1
+            found = True
+
+        if torn:
+            # Start clean so new events don't land after the damaged line
+            self.compact()
+
+        return dict(self.state, commands_learned=list(self.state["commands_learned"])) if found else None
+
+    def _read_journal(self) -> Tuple[List[Dict[str, Any]], bool]:
+        """Journal events, and whether reading stopped at a damaged line"""
+        events = []
+        try:
+            with open(self.journal_file, 'r') as f:
+                for line in f:
+                    try:
+                        events.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-append
+                        return events, True
+        except FileNotFoundError:
+            pass
+        return events, False
+
+    def _apply(self, event: Dict[str, Any]):
+        if "pos" in event:
+            self.state["position"] = event["pos"]
+            self.state["lesson_context"] = event.get("ctx")
+            self.state["expecting_command"] = event.get("exp")
+        learned = event.get("learn")
+        if learned and learned not in self.state["commands_learned"]:
+            self.state["commands_learned"].append(learned)
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+
+    def record_section(self, position: int, lesson_context: Optional[str], expecting_command: Optional[str]):
+        """The learner reached a section that waits for a command (or the end of the story)"""
+        self._append({"pos": position, "ctx": lesson_context, "exp": expecting_command})
+
+    def record_learned(self, command: str):
+        """The learner used a story command for the first time"""
+        self._append({"learn": command})
+
+    def _append(self, event: Dict[str, Any]):
+        self.seq += 1
+        event["s"] = self.seq
+        self._apply(event)
+
+        if self.journal is None:
+            self.journal = open(self.journal_file, 'a')
+        self.journal.write(json.dumps(event, separators=(",", ":")) + "\n")
+        # Hand it to the OS now; fsync (the slow part) is batched
+        self.journal.flush()
+        self.journal_events += 1
+        self.unsynced += 1
+
+        if self.journal_events >= self.compact_every:
+            self.compact()
+        elif self.unsynced >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """fsync any journal events written since the last sync"""
+        if self.journal is not None and self.unsynced:
+            os.fsync(self.journal.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot and start an empty journal"""
+        snapshot = {"version": SNAPSHOT_VERSION, "seq": self.seq, "state": self.state}
+        write_atomically(self.save_file, json.dumps(snapshot, indent=2).encode())
+
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        write_atomically(self.journal_file, b"")
+        self.journal_events = 0
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        """Make everything written so far durable"""
+        if self.journal is not None:
+            self.sync()
+            self.journal.close()
+            self.journal = None
+
+    def reset(self):
+        """Forget all saved progress"""
+        self.close()
+        for path in (self.save_file, self.journal_file):
+            if path.exists():
+                path.unlink()
+        self.state = self._empty_state()
+        self.seq = 0
+        self.journal_events = 0
@@ -0,0 +1,249 @@
+"""
+Renderer for Terminal Quest: Remastered
+Composes each screen into one buffer and writes it with a single flush,
+clearing and positioning with ANSI sequences instead of running `clear`,
+and lays text and art out for the terminal's current width
+"""
+
+import shutil
+import signal
+import sys
+import textwrap
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+CLEAR = "\033[2J\033[H"
+CLEAR_LINE = "\033[K"
+CLEAR_BELOW = "\033[J"
+
+
+# Narrowest layout we attempt; anything smaller just wraps
+MIN_WIDTH = 20
+LAYOUT_CACHE_SIZE = 512
+
+
+def move_to(row: int) -> str:
+    """Cursor to the start of a (1-based) screen row"""
+    return f"\033[{row};1H"
+
+
+def reflow(text: str, width: int) -> str:
+    """Wrap each line of text to width, keeping its indentation as a hanging indent"""
+    wrapped = []
+    for line in text.split("\n"):
+        if len(line) <= width:
+            wrapped.append(line)
+            continue
+        indent = line[:len(line) - len(line.lstrip())]
+        wrapped.append(textwrap.fill(line.strip(), width, initial_indent=indent, subsequent_indent=indent,
+                                     break_on_hyphens=False))
+    return "\n".join(wrapped)
+
+
+def fit_art(lines: List[str], width: int, mode: str = "scale") -> List[str]:
+    """
+    Make art no wider than width
+
+    "scale" samples columns (and rows, to keep the proportions) evenly;
+    "crop" keeps the middle columns.
+    """
+    art_width = max((len(line) for line in lines), default=0)
+    if art_width <= width:
+        return list(lines)
+
+    if mode == "crop":
+        start = (art_width - width) // 2
+        return [line[start:start + width] for line in lines]
+
+    # Evenly spaced samples that always include the first and last column/row (the frame)
+    columns = [round(column * (art_width - 1) / max(1, width - 1)) for column in range(width)]
+    height = max(1, round(len(lines) * width / art_width))
+    rows = [lines[round(row * (len(lines) - 1) / max(1, height - 1))] for row in range(height)]
+    return ["".join(row[column] if column < len(row) else " " for column in columns).rstrip() for row in rows]
+
+
+class Renderer:
+    """
+    Writes frames to the terminal and keeps what is on screen
+
+    The on-screen model is per thread, so one renderer can serve every
+    session of the session server (each session runs on its own thread
+    and sys.stdout routes to its socket).
+    """
+
+    def __init__(self, stream=None, width: Optional[int] = None, art_fit: str = "scale"):
+        """
+        Args:
+            stream: Output stream; None means "whatever sys.stdout is at write time"
+            width: Fixed layout width; None follows the terminal (and its resizes)
+            art_fit: "scale" or "crop" for art wider than the screen
+        """
+        self.stream = stream
+        self.fixed_width = width
+        self.art_fit = art_fit
+        self._width = None
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.frames = 0
+        self.bytes_written = 0
+        self.render_time = 0.0
+        self.last_frame = None
+
+        # (kind, content, width) -> laid-out result
+        self.layout_cache = OrderedDict()
+        self._layout_lock = threading.Lock()
+        self.layout_hits = 0
+        self.layout_misses = 0
+
+    # ------------------------------------------------------------------
+    # Width-aware layout
+    # ------------------------------------------------------------------
+
+    def width(self) -> int:
+        """Columns available for layout"""
+        if self.fixed_width:
+            return self.fixed_width
+        if self._width is None:
+            self._width = max(MIN_WIDTH, shutil.get_terminal_size((80, 24)).columns)
+        return self._width
+
+    def install_resize_handler(self):
+        """Re-measure the terminal (and drop cached layouts) on SIGWINCH; main thread only"""
+        if self.fixed_width or not hasattr(signal, "SIGWINCH"):
+            return
+        if threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signal.SIGWINCH)
+
+        def on_resize(signum, frame):
+            self.on_resize()
+            if callable(previous):
+                previous(signum, frame)
+
+        signal.signal(signal.SIGWINCH, on_resize)
+
+    def on_resize(self):
+        self._width = None
+        with self._layout_lock:
+            self.layout_cache.clear()
+
+    def _layout(self, kind: str, content, build):
+        width = self.width()
+        key = (kind, content, width)
+        with self._layout_lock:
+            result = self.layout_cache.get(key)
+            if result is not None:
+                self.layout_cache.move_to_end(key)
+                self.layout_hits += 1
+                return result
+
+        result = build(width)
+        with self._layout_lock:
+            self.layout_misses += 1
+            self.layout_cache[key] = result
+            while len(self.layout_cache) > LAYOUT_CACHE_SIZE:
+                self.layout_cache.popitem(last=False)
+        return result
+
+    def layout_text(self, text: str) -> str:
+        """Text reflowed to the current width (cached)"""
+        return self._layout("text", text, lambda width: reflow(text, width))
+
+    def layout_art(self, frame: str) -> str:
+        """A pre-joined art frame scaled or cropped to the current width (cached)"""
+        return self._layout("art", frame, lambda width: "\n".join(fit_art(frame.split("\n"), width, self.art_fit)))
+
+    # ------------------------------------------------------------------
+    # Output
+    # ------------------------------------------------------------------
+
+    @property
+    def screen(self) -> Optional[List[str]]:
+        """Lines drawn by draw_screen, or None if the screen content is unknown"""
+        return getattr(self._local, "screen", None)
+
+    @screen.setter
+    def screen(self, lines: Optional[List[str]]):
+        self._local.screen = lines
+
+    def _write(self, data: str, started: float, kind: str):
+        out = self.stream or sys.stdout
+        out.write(data)
+        out.flush()
+
+        elapsed = time.perf_counter() - started
+        size = len(data.encode("utf-8", errors="replace"))
+        with self._stats_lock:
+            self.frames += 1
+            self.bytes_written += size
+            self.render_time += elapsed
+            self.last_frame = {"kind": kind, "bytes": size, "seconds": elapsed}
+
+    def clear(self):
+        """Clear the screen and home the cursor"""
+        self._write(CLEAR, time.perf_counter(), "clear")
+        self.screen = None
+
+    def show(self, text: str, clear: bool = False):
+        """Write a block of text (optionally on a cleared screen) as one frame"""
+        started = time.perf_counter()
+        parts = [CLEAR] if clear else []
+        parts.append(text if text.endswith("\n") else text + "\n")
+        self._write("".join(parts), started, "text")
+        # Scrolling text: we no longer know exactly what is where
+        self.screen = None
+
+    def draw_screen(self, lines: List[str]):
+        """
+        Draw a full screen of lines from the top
+
+        If this thread's last frame was a screen, only the rows that changed
+        are rewritten; anything printed below it since (e.g. a "Press any
+        key" prompt) is erased.
+        """
+        started = time.perf_counter()
+        previous = self.screen
+
+        if previous is None:
+            parts = [CLEAR, "\n".join(lines), "\n"]
+            kind = "full"
+        else:
+            parts = []
+            for row, line in enumerate(lines):
+                if row >= len(previous) or previous[row] != line:
+                    parts.append(f"{move_to(row + 1)}{line}{CLEAR_LINE}")
+            # Cursor below the content, like a normal print would leave it
+            parts.append(move_to(len(lines) + 1) + CLEAR_BELOW)
+            kind = "diff"
+
+        self._write("".join(parts), started, kind)
+        self.screen = list(lines)
+
+    def invalidate(self):
+        """Forget the on-screen model (other output has moved things around)"""
+        self.screen = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Frames written, bytes, and render time (total, average and last frame)"""
+        with self._stats_lock:
+            return {
+                "frames": self.frames,
+                "bytes": self.bytes_written,
+                "render_time": self.render_time,
+                "avg_frame_ms": self.render_time / self.frames * 1000 if self.frames else 0.0,
+                "last_frame": dict(self.last_frame) if self.last_frame else None,
+                "width": self.width(),
+                "layout_hits": self.layout_hits,
+                "layout_misses": self.layout_misses
+            }
+
+    def format_stats(self) -> str:
+        stats = self.get_stats()
+        line = (f"[RENDER] {stats['frames']} frames, {stats['bytes']} bytes, "
+                f"{stats['avg_frame_ms']:.3f}ms average")
+        last = stats["last_frame"]
+        if last:
+            line += f"; last frame ({last['kind']}): {last['bytes']} bytes in {last['seconds'] * 1000:.3f}ms"
+        return line
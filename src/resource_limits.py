@@ -0,0 +1,295 @@
+"""
+Resource Limits for Terminal Quest: Remastered
+Applies per-command limits to child processes and reports what each run used
+"""
+
+import codecs
+import os
+import resource
+import selectors
+import signal
+import subprocess
+import time
+from collections import namedtuple
+from typing import Any, Dict, Optional, Tuple
+
+from metrics import REGISTRY
+
+# Defaults are generous enough for every lesson in the story, but keep a
+# runaway `find /` or `yes` from hogging a shared lab machine.
+DEFAULT_LIMITS = {
+    "cpu_seconds": 10,
+    "address_space_mb": 1024,
+    "open_files": 256,
+    "output_bytes": 1024 * 1024,
+    "timeout": 30
+}
+
+_UsageDelta = namedtuple("_UsageDelta", ["ru_utime", "ru_stime", "ru_maxrss"])
+
+EXECUTION_TIME = REGISTRY.histogram("execution_seconds", "Wall time of learner commands run as subprocesses")
+TIMEOUTS = REGISTRY.counter("execution_timeouts_total", "Commands killed for running past the time limit")
+TRUNCATIONS = REGISTRY.counter("execution_truncations_total", "Commands killed for printing past the output limit")
+
+
+class ResourceLimiter:
+    def __init__(self, limits: Optional[Dict[str, Any]] = None):
+        self.limits = dict(DEFAULT_LIMITS)
+        if limits:
+            self.limits.update(limits)
+
+    def shell_limits(self) -> str:
+        """
+        ulimit commands that apply the limits in the child's shell, before the command runs
+
+        A shell prefix rather than a preexec_fn, which isn't safe to use
+        from a process with threads (the session server, the async REPL).
+        """
+        limits = []
+        cpu = self.limits.get("cpu_seconds")
+        if cpu:
+            # Soft limit sends SIGXCPU, the hard limit one second later kills
+            limits.append(f"ulimit -S -t {int(cpu)}; ulimit -H -t {int(cpu) + 1}")
+
+        address_space = self.limits.get("address_space_mb")
+        if address_space:
+            limits.append(f"ulimit -v {int(address_space) * 1024}")
+
+        open_files = self.limits.get("open_files")
+        if open_files:
+            limits.append(f"ulimit -n {int(open_files)}")
+        return "".join(f"{limit}; " for limit in limits)
+
+    def run(self, command: str, cwd: str, on_output=None, env=None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Run a shell command under the configured limits
+
+        Args:
+            command: The shell command line
+            cwd: Working directory for the child
+            on_output: Optional callback receiving each decoded output chunk
+            env: Optional environment for the child (defaults to ours)
+
+        Returns:
+            Tuple[str, dict]: (combined stdout/stderr, resource report)
+        """
+        max_output = int(self.limits.get("output_bytes") or 0)
+        timeout = self.limits.get("timeout") or None
+
+        start = time.monotonic()
+        process = subprocess.Popen(
+            self.shell_limits() + command,
+            shell=True,
+            cwd=cwd,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            # Own session (and process group) so a timeout can take down the whole pipeline
+            start_new_session=True
+        )
+
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        chunks = []
+        received = 0
+        truncated = False
+        timed_out = False
+
+        with selectors.DefaultSelector() as selector:
+            selector.register(process.stdout, selectors.EVENT_READ)
+            while True:
+                remaining = None
+                if timeout:
+                    remaining = timeout - (time.monotonic() - start)
+                    if remaining <= 0:
+                        timed_out = True
+                        self._kill_group(process)
+                        break
+
+                if not selector.select(remaining):
+                    continue
+
+                data = os.read(process.stdout.fileno(), 65536)
+                if not data:
+                    break
+
+                if max_output and received + len(data) > max_output:
+                    data = data[:max_output - received]
+                    truncated = True
+
+                received += len(data)
+                if data:
+                    chunks.append(data)
+                    if on_output is not None:
+                        on_output(decoder.decode(data))
+
+                if truncated:
+                    self._kill_group(process)
+                    break
+
+        process.stdout.close()
+        report = self._reap(process, start)
+        report["output_bytes"] = received
+        report["truncated"] = truncated
+        report["timed_out"] = timed_out
+        self._record_metrics(report)
+
+        output = b"".join(chunks).decode(errors="replace")
+        if truncated:
+            output += f"\n[Output truncated after {max_output} bytes]"
+        if timed_out:
+            output += f"\nCommand timed out (took longer than {timeout} seconds)"
+
+        return output, report
+
+    async def run_async(self, command: str, cwd: str, on_output=None, env=None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Run a shell command under the configured limits using an asyncio subprocess
+
+        Cancelling the awaiting task kills the command's whole process group.
+        """
+        # Only the asyncio REPL gets here, and it has already imported asyncio;
+        # the blocking game loop never pays for the import
+        import asyncio
+
+        max_output = int(self.limits.get("output_bytes") or 0)
+        timeout = self.limits.get("timeout") or None
+
+        # asyncio reaps the child itself, so wait4() isn't available here;
+        # diff the RUSAGE_CHILDREN CPU totals instead. Their ru_maxrss is the
+        # peak of every child so far, not this one, so memory isn't reported.
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.monotonic()
+        process = await asyncio.create_subprocess_shell(
+            self.shell_limits() + command,
+            cwd=cwd,
+            env=env,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            # Own session (and process group) so a timeout can take down the whole pipeline
+            start_new_session=True
+        )
+
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        chunks = []
+        state = {"received": 0, "truncated": False}
+
+        async def pump():
+            while True:
+                data = await process.stdout.read(65536)
+                if not data:
+                    return
+
+                if max_output and state["received"] + len(data) > max_output:
+                    data = data[:max_output - state["received"]]
+                    state["truncated"] = True
+
+                state["received"] += len(data)
+                if data:
+                    chunks.append(data)
+                    if on_output is not None:
+                        on_output(decoder.decode(data))
+
+                if state["truncated"]:
+                    self._kill_group(process)
+                    return
+
+        timed_out = False
+        try:
+            await asyncio.wait_for(pump(), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            self._kill_group(process)
+        except asyncio.CancelledError:
+            self._kill_group(process)
+            await process.wait()
+            raise
+
+        await process.wait()
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        usage = _UsageDelta(
+            ru_utime=after.ru_utime - before.ru_utime,
+            ru_stime=after.ru_stime - before.ru_stime,
+            ru_maxrss=None
+        )
+        report = self._build_report(usage, time.monotonic() - start, process.returncode)
+        report["output_bytes"] = state["received"]
+        report["truncated"] = state["truncated"]
+        report["timed_out"] = timed_out
+        self._record_metrics(report)
+
+        output = b"".join(chunks).decode(errors="replace")
+        if state["truncated"]:
+            output += f"\n[Output truncated after {max_output} bytes]"
+        if timed_out:
+            output += f"\nCommand timed out (took longer than {timeout} seconds)"
+
+        return output, report
+
+    def _record_metrics(self, report: Dict[str, Any]):
+        EXECUTION_TIME.observe(report["wall_time"])
+        if report["timed_out"]:
+            TIMEOUTS.inc()
+        if report["truncated"]:
+            TRUNCATIONS.inc()
+
+    def _kill_group(self, process):
+        """Kill the child's whole process group"""
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _reap(self, process, start: float) -> Dict[str, Any]:
+        """Wait for the child and collect its rusage"""
+        _, status, usage = os.wait4(process.pid, 0)
+        # We reaped the child ourselves, so tell Popen about it
+        process.returncode = os.waitstatus_to_exitcode(status)
+        return self._build_report(usage, time.monotonic() - start, process.returncode)
+
+    def _build_report(self, usage, wall_time: float, returncode: int) -> Dict[str, Any]:
+        """Build a resource report from an rusage struct"""
+        return {
+            "user_time": usage.ru_utime,
+            "sys_time": usage.ru_stime,
+            "max_rss_kb": usage.ru_maxrss,
+            "wall_time": wall_time,
+            "returncode": returncode,
+            # The shell reports a killed pipeline as 128 + signal number
+            "cpu_limited": returncode in (-signal.SIGXCPU, 128 + signal.SIGXCPU)
+        }
+
+    def format_report(self, report: Optional[Dict[str, Any]]) -> str:
+        """Format a resource report for display"""
+        if not report:
+            return "[SHELL] No commands have been run yet."
+
+        max_rss = report['max_rss_kb']
+        memory = f"{max_rss / 1024:.1f} MB" if max_rss is not None else "not measured"
+        lines = [
+            "[SHELL] Resources used by your last command:",
+            f"  Wall time:   {report['wall_time']:.3f}s",
+            f"  User time:   {report['user_time']:.3f}s",
+            f"  System time: {report['sys_time']:.3f}s",
+            f"  Max memory:  {memory}",
+            f"  Output:      {report['output_bytes']} bytes"
+        ]
+        if report.get("truncated"):
+            lines.append("  (output was cut off at the limit)")
+        if report.get("timed_out"):
+            lines.append("  (command hit the time limit)")
+        if report.get("cpu_limited"):
+            lines.append("  (command hit the CPU limit)")
+        return "\n".join(lines)
+
+    def format_limits(self) -> str:
+        """Format the configured limits for display"""
+        return "\n".join([
+            "[SHELL] Current limits for each command:",
+            f"  CPU time:      {self.limits.get('cpu_seconds') or 'unlimited'} seconds",
+            f"  Memory:        {self.limits.get('address_space_mb') or 'unlimited'} MB",
+            f"  Open files:    {self.limits.get('open_files') or 'unlimited'}",
+            f"  Output:        {self.limits.get('output_bytes') or 'unlimited'} bytes",
+            f"  Time limit:    {self.limits.get('timeout') or 'unlimited'} seconds"
+        ])
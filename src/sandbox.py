@@ -0,0 +1,299 @@
+"""
+Sandbox for Terminal Quest: Remastered
+Builds the learner's practice directory from the declarative template in
+sandbox_template.json. Each template file is hashed into a manifest, and
+applying the template only writes what is missing or out of date: files the
+learner has edited are left alone, and unchanged files are never rewritten.
+"""
+
+import argparse
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import stat
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from metrics import REGISTRY
+from progress import write_atomically
+
+GAME_DIR = Path(__file__).parent
+TEMPLATE_FILE = "sandbox_template.json"
+SANDBOX_NAME = "terminal_quest_sandbox"
+# What was last placed in a sandbox (path -> hash, size, mtime), kept inside it
+STATE_FILE = ".terminal_quest_sandbox.json"
+TEMPLATE_VERSION = 1
+# ioctl that shares a file's blocks with a new file (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+APPLY_TIME = REGISTRY.histogram("sandbox_apply_seconds", "Time to bring a sandbox up to date with its template")
+FILES_WRITTEN = REGISTRY.counter("sandbox_files_written_total", "Template files placed in sandboxes")
+
+
+def default_cache_dir() -> Path:
+    cache_home = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    return cache_home / "terminal_quest" / "sandbox"
+
+
+def clone_file(source: Path, target: Path):
+    """Copy a file, sharing its blocks (a reflink) where the filesystem supports it"""
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return
+        except OSError:
+            pass
+        shutil.copyfileobj(src, dst)
+
+
+class TemplateEntry:
+    def __init__(self, path: str, content: bytes, read_only: bool = False):
+        self.path = path
+        self.content = content
+        self.sha256 = hashlib.sha256(content).hexdigest()
+        self.read_only = read_only
+
+
+class SandboxTemplate:
+    """
+    The compiled template: directories, and files with their content hashes
+
+    Files are written once to a cache directory named after the template's
+    hash, and placed in sandboxes from there as reflinks (or plain copies).
+    Read-only files are hard-linked only when the learner can't modify the
+    shared inode (the cache belongs to another user); a link they own could
+    be chmod'ed and edited, changing every other sandbox's copy too.
+    """
+
+    def __init__(self, data: Dict[str, Any], cache_dir: Optional[Path] = None):
+        if data.get("version") != TEMPLATE_VERSION:
+            raise ValueError(f"Unsupported sandbox template version {data.get('version')!r}")
+        self.directories = tuple(sorted(Path(directory).as_posix() for directory in data.get("directories", ())))
+        self.entries: Dict[str, TemplateEntry] = {}
+        for path, spec in sorted(data.get("files", {}).items()):
+            relative = Path(path)
+            if relative.is_absolute() or ".." in relative.parts:
+                raise ValueError(f"Sandbox template path '{path}' must stay inside the sandbox")
+            self.entries[relative.as_posix()] = TemplateEntry(
+                relative.as_posix(), spec.get("content", "").encode('utf-8'), spec.get("read_only", False)
+            )
+
+        # The manifest: what the sandbox should contain, and its digest
+        manifest = {"directories": self.directories,
+                    "files": {path: [entry.sha256, entry.read_only] for path, entry in self.entries.items()}}
+        self.digest = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+        self.cache_dir = (Path(cache_dir) if cache_dir else default_cache_dir()) / self.digest[:16]
+        self._materialized = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: Path, cache_dir: Optional[Path] = None) -> "SandboxTemplate":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), cache_dir)
+
+    # ------------------------------------------------------------------
+    # Template cache
+    # ------------------------------------------------------------------
+
+    def materialize(self) -> Path:
+        """Write the template files to the cache directory (once), checking earlier copies"""
+        with self._lock:
+            if self._materialized:
+                return self.cache_dir
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            for entry in self.entries.values():
+                source = self.cache_dir / entry.path
+                # Sandboxes placed by older versions may hard-link here, and an edit there changes this inode too
+                if self._same_content(source, entry):
+                    continue
+                source.parent.mkdir(parents=True, exist_ok=True)
+                write_atomically(source, entry.content)
+                source.chmod(0o444 if entry.read_only else 0o644)
+            self._materialized = True
+            return self.cache_dir
+
+    def _place(self, entry: TemplateEntry, target: Path):
+        """Put a template file at target, replacing whatever is there"""
+        source = self.materialize() / entry.path
+        if target.is_symlink() or target.exists():
+            if target.is_dir() and not target.is_symlink():
+                shutil.rmtree(target)
+            else:
+                target.unlink()
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if entry.read_only and self._shareable(source):
+            try:
+                os.link(source, target)
+                return
+            except OSError as e:
+                # Different filesystem, or links not allowed: fall back to a copy
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EACCES):
+                    raise
+        clone_file(source, target)
+        target.chmod(0o444 if entry.read_only else 0o644)
+
+    # ------------------------------------------------------------------
+    # Applying
+    # ------------------------------------------------------------------
+
+    @APPLY_TIME.time
+    def apply(self, sandbox: Path, reset: bool = False) -> Dict[str, int]:
+        """
+        Bring a sandbox up to date with the template
+
+        Files placed earlier and untouched since (same size and mtime) are
+        updated only if the template changed. Files the learner edited are
+        kept, unless reset is set: then every template file is restored and
+        anything not in the template is removed.
+
+        Returns:
+            dict: How many files were written, kept (learner edits), unchanged and removed
+        """
+        sandbox = Path(sandbox)
+        sandbox.mkdir(parents=True, exist_ok=True)
+        state_path = sandbox / STATE_FILE
+        recorded_template, recorded = self._read_state(state_path)
+        placed = {}
+        counts = {"written": 0, "kept": 0, "unchanged": 0, "removed": 0}
+
+        for directory in self.directories:
+            (sandbox / directory).mkdir(parents=True, exist_ok=True)
+
+        for path, entry in self.entries.items():
+            target = sandbox / path
+            try:
+                current = target.lstat()
+            except FileNotFoundError:
+                current = None
+
+            record = recorded.get(path)
+            if current is not None and stat.S_ISREG(current.st_mode):
+                untouched = record is not None and record[1:] == [current.st_size, current.st_mtime_ns]
+                # A hard link the learner could edit (from an older version) is replaced with a copy
+                shared = current.st_nlink > 1 and not self._shareable(target)
+                if untouched and record[0] == entry.sha256 and not shared:
+                    placed[path] = record
+                    counts["unchanged"] += 1
+                    continue
+                if not untouched:
+                    if self._same_content(target, entry):
+                        if not shared:
+                            # Already right (e.g. from before the state file existed)
+                            placed[path] = [entry.sha256, current.st_size, current.st_mtime_ns]
+                            counts["unchanged"] += 1
+                            continue
+                    elif not reset:
+                        counts["kept"] += 1
+                        continue
+
+            self._place(entry, target)
+            after = target.stat()
+            placed[path] = [entry.sha256, after.st_size, after.st_mtime_ns]
+            counts["written"] += 1
+
+        if reset:
+            counts["removed"] = self._remove_extras(sandbox)
+
+        FILES_WRITTEN.inc(counts["written"])
+        if placed != recorded or recorded_template != self.digest:
+            state = {"template": self.digest, "files": placed}
+            write_atomically(state_path, json.dumps(state, separators=(",", ":")).encode())
+        return counts
+
+    def reset(self, sandbox: Path) -> Dict[str, int]:
+        """Restore a sandbox to exactly the template (learner files and edits are lost)"""
+        return self.apply(sandbox, reset=True)
+
+    def _shareable(self, path: Path) -> bool:
+        """Whether a file may be hard-linked into sandboxes: only if we (and so the learner) can't change it"""
+        uid = os.geteuid()
+        try:
+            return uid != 0 and path.stat().st_uid != uid
+        except OSError:
+            return False
+
+    def _same_content(self, target: Path, entry: TemplateEntry) -> bool:
+        try:
+            if target.stat().st_size != len(entry.content):
+                return False
+            return hashlib.sha256(target.read_bytes()).hexdigest() == entry.sha256
+        except OSError:
+            return False
+
+    def _read_state(self, state_path: Path) -> Tuple[Optional[str], Dict[str, list]]:
+        """(template digest, files placed) from a sandbox's state file"""
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None, {}
+        return state.get("template"), dict(state.get("files", {}))
+
+    def _remove_extras(self, sandbox: Path) -> int:
+        """Delete everything under the sandbox that isn't part of the template"""
+        keep_dirs = set()
+        for path in list(self.directories) + [str(Path(p).parent) for p in self.entries]:
+            parts = Path(path).parts
+            keep_dirs.update(Path(*parts[:depth]).as_posix() for depth in range(1, len(parts) + 1))
+        removed = 0
+        for root, dirs, files in os.walk(sandbox, topdown=True):
+            relative_root = Path(root).relative_to(sandbox)
+            for name in list(dirs):
+                relative = (relative_root / name).as_posix()
+                if relative not in keep_dirs:
+                    path = Path(root) / name
+                    if path.is_symlink():
+                        path.unlink()
+                    else:
+                        shutil.rmtree(path, onerror=_make_writable_and_retry)
+                    dirs.remove(name)
+                    removed += 1
+            for name in files:
+                relative = (relative_root / name).as_posix()
+                if relative not in self.entries and relative != STATE_FILE:
+                    (Path(root) / name).unlink()
+                    removed += 1
+        return removed
+
+
+def _make_writable_and_retry(function, path, exc_info):
+    """rmtree error handler: the learner may have chmod'ed a directory read-only"""
+    Path(path).parent.chmod(0o755)
+    function(path)
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def load_template(game_dir: Path = GAME_DIR) -> SandboxTemplate:
+    """The process-wide compiled template for a game directory"""
+    key = Path(game_dir).resolve()
+    with _loaded_lock:
+        template = _loaded.get(key)
+        if template is None:
+            template = _loaded[key] = SandboxTemplate.from_file(key / TEMPLATE_FILE)
+        return template
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create, update or reset a Terminal Quest sandbox')
+    parser.add_argument('sandbox', nargs='?', type=Path, default=Path.home() / SANDBOX_NAME,
+                        help='Sandbox directory (default: ~/terminal_quest_sandbox)')
+    parser.add_argument('--game-dir', type=Path, default=GAME_DIR, help='Directory with sandbox_template.json')
+    parser.add_argument('--reset', action='store_true', help='Restore the template exactly, removing learner files')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = load_template(args.game_dir).apply(args.sandbox, reset=args.reset)
+    print(f"[SANDBOX] {args.sandbox}: {counts['written']} written, {counts['kept']} kept (edited), "
+          f"{counts['unchanged']} unchanged, {counts['removed']} removed in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
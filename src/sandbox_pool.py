@@ -0,0 +1,216 @@
+"""
+Sandbox Pool for Terminal Quest: Remastered
+Keeps learner home directories, each with a sandbox already built from the
+template, ready on a local tmpfs so the session server can hand one out the
+moment a learner connects. Finished homes are recycled in the background:
+optionally exported to persistent storage, then reset to the template and
+put back in the pool.
+"""
+
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from metrics import REGISTRY
+from sandbox import GAME_DIR, SANDBOX_NAME, TEMPLATE_FILE, SandboxTemplate
+
+DEFAULT_SIZE = 4
+
+ACQUIRE_TIME = REGISTRY.histogram("sandbox_acquire_seconds", "Time to hand a new session its home directory")
+RECYCLE_TIME = REGISTRY.histogram("sandbox_recycle_seconds", "Time to export and reset a finished session's home")
+POOL_HITS = REGISTRY.counter("sandbox_pool_hits_total", "Sessions given a pre-warmed home")
+POOL_MISSES = REGISTRY.counter("sandbox_pool_misses_total", "Sessions whose home had to be built on connect")
+
+_STOP = object()
+
+
+def default_pool_root() -> Path:
+    """A per-user directory on a RAM-backed filesystem if there is one"""
+    shm = Path("/dev/shm")
+    base = shm if shm.is_dir() and os.access(shm, os.W_OK) else Path(tempfile.gettempdir())
+    return base / f"terminal_quest-{os.getuid()}"
+
+
+def remove_tree(path: Path):
+    """Delete a file, link or directory, even one the learner made read-only"""
+    def make_writable(function, failed, exc_info):
+        Path(failed).parent.chmod(0o700)
+        function(failed)
+
+    if path.is_symlink() or not path.is_dir():
+        path.unlink(missing_ok=True)
+    else:
+        shutil.rmtree(path, onerror=make_writable)
+
+
+class SandboxPool:
+    def __init__(self, root: Optional[Path] = None, size: int = DEFAULT_SIZE, game_dir: Path = GAME_DIR,
+                 export_dir: Optional[Path] = None):
+        """
+        Args:
+            root: Where homes are kept (defaults to a directory under /dev/shm)
+            size: Homes to keep ready
+            export_dir: Persistent directory finished homes are copied to before recycling
+        """
+        self.root = Path(root).expanduser() if root else default_pool_root()
+        self.size = max(1, size)
+        self.export_dir = Path(export_dir).expanduser() if export_dir else None
+        self.root.mkdir(parents=True, exist_ok=True, mode=0o700)
+        # Homes left ready by an earlier server are stale (the template may have changed)
+        for stale in self.root.glob("warm-*"):
+            remove_tree(stale)
+
+        # The template cache sits on the same fast filesystem; files are copied
+        # from it, never hard-linked, so no two homes share an inode
+        self.template = SandboxTemplate.from_file(Path(game_dir) / TEMPLATE_FILE, cache_dir=self.root / "template")
+
+        self.ready = queue.Queue()
+        self.recycling = queue.Queue()
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "built": 0, "recycled": 0, "exported": 0, "discarded": 0}
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], game_dir: Path = GAME_DIR) -> Optional["SandboxPool"]:
+        """Build from the 'sandbox_pool' block of config.json; None if the pool is off"""
+        settings = config.get('sandbox_pool', {})
+        if not settings.get('enabled', False):
+            return None
+        return cls(settings.get('root'), settings.get('size', DEFAULT_SIZE), game_dir, settings.get('export_dir'))
+
+    def start(self):
+        """Fill the pool and start recycling in the background"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sandbox-pool", daemon=True)
+            self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Handing out and taking back homes
+    # ------------------------------------------------------------------
+
+    @ACQUIRE_TIME.time
+    def acquire(self, name: str) -> Path:
+        """
+        A home directory with a ready sandbox, renamed to name (built now if the pool is empty)
+
+        If a home called name is left from an earlier run (a crash, or kept
+        sandboxes), it is left alone and the new one gets a numbered name.
+        """
+        target = self.root / name
+        number = 1
+        while target.exists():
+            number += 1
+            target = self.root / f"{name}.{number}"
+        try:
+            home = self.ready.get_nowait()
+            hit = True
+        except queue.Empty:
+            home = self._build()
+            hit = False
+        with self.lock:
+            self.stats["hits" if hit else "misses"] += 1
+        (POOL_HITS if hit else POOL_MISSES).inc()
+        os.replace(home, target)
+        return target
+
+    def release(self, home: Path, export: bool = True):
+        """Give a finished home back; it is exported (if configured) and reset in the background"""
+        self.recycling.put((Path(home), export and self.export_dir is not None))
+
+    # ------------------------------------------------------------------
+    # Background work
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            # Finished homes first: they are the cheapest way to refill
+            try:
+                job = self.recycling.get(timeout=0.5 if self.ready.qsize() >= self.size else 0)
+            except queue.Empty:
+                job = None
+            if job is _STOP:
+                return
+            if job is not None:
+                self._recycle(*job)
+            elif self.ready.qsize() < self.size:
+                try:
+                    self.ready.put(self._build())
+                except OSError as e:
+                    print(f"[POOL] Could not prepare a sandbox: {e}")
+                    time.sleep(1.0)
+
+    def _new_name(self) -> str:
+        with self.lock:
+            self.next_id += 1
+            return f"warm-{self.next_id}"
+
+    def _build(self) -> Path:
+        home = self.root / self._new_name()
+        home.mkdir(mode=0o700)
+        self.template.apply(home / SANDBOX_NAME)
+        with self.lock:
+            self.stats["built"] += 1
+        return home
+
+    @RECYCLE_TIME.time
+    def _recycle(self, home: Path, export: bool):
+        if export:
+            try:
+                destination = self.export_dir / f"{home.name}-{time.strftime('%Y%m%d-%H%M%S')}"
+                shutil.copytree(home, destination, symlinks=True)
+                with self.lock:
+                    self.stats["exported"] += 1
+            except (OSError, shutil.Error) as e:
+                print(f"[POOL] Could not export {home.name}: {e}")
+
+        if self.ready.qsize() >= self.size:
+            remove_tree(home)
+            return
+        try:
+            # Back to the starting state: only the sandbox, exactly as the template has it
+            for child in home.iterdir():
+                if child.name != SANDBOX_NAME:
+                    remove_tree(child)
+            sandbox = home / SANDBOX_NAME
+            if sandbox.is_symlink() or (sandbox.exists() and not sandbox.is_dir()):
+                remove_tree(sandbox)
+            self.template.reset(sandbox)
+            warm = self.root / self._new_name()
+            os.replace(home, warm)
+        except OSError as e:
+            print(f"[POOL] Discarding {home.name} instead of recycling it: {e}")
+            with self.lock:
+                self.stats["discarded"] += 1
+            shutil.rmtree(home, ignore_errors=True)
+            return
+        with self.lock:
+            self.stats["recycled"] += 1
+        self.ready.put(warm)
+
+    def close(self):
+        """Finish pending recycling (and exports), then remove every pooled home"""
+        if self._thread is not None:
+            self.recycling.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        while True:
+            try:
+                job = self.recycling.get_nowait()
+            except queue.Empty:
+                break
+            if job is not _STOP:
+                self._recycle(*job)
+        while True:
+            try:
+                remove_tree(self.ready.get_nowait())
+            except queue.Empty:
+                break
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, ready=self.ready.qsize(), pending=self.recycling.qsize(), root=str(self.root))
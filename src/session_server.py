@@ -0,0 +1,488 @@
+"""
+Session Server for Terminal Quest: Remastered
+Hosts many learners' TerminalQuest sessions in one process over a local socket
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import socket
+import socketserver
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ai_integration import AICommandAnalyzer, MockCommandAnalyzer
+from ai_scheduler import AIRequestScheduler
+from ascii_display import ASCIIDisplay
+from content_bundle import load_content
+from event_log import EventLog
+from main import TerminalQuest
+from metrics import REGISTRY, MetricsExporter
+from pacing import Pacing
+from renderer import Renderer
+from safety_system import SafetySystem
+from sandbox_pool import SandboxPool
+
+GAME_DIR = Path(__file__).parent
+DEFAULT_SOCKET = Path(os.environ.get("XDG_RUNTIME_DIR", tempfile.gettempdir())) / "terminal_quest.sock"
+
+
+class SharedResources:
+    """Everything sessions can share: content, the compiled story, rule engines, AI client and caches"""
+
+    def __init__(self, game_dir: Path = GAME_DIR, mock_ai_latency: Optional[float] = None):
+        self.game_dir = Path(game_dir)
+
+        with open(self.game_dir / "config.json", 'r') as f:
+            self.config = json.load(f)
+
+        # Chapters are loaded on demand and shared by every session
+        self.story_engine = load_content(self.game_dir).engine
+
+        self.pacing = Pacing.from_config(self.config)
+        # Writes go to sys.stdout, i.e. the current session's socket; a socket
+        # has no terminal size, so lay out for the configured width
+        display = self.config.get('display', {})
+        self.renderer = Renderer(width=display.get('width') or 80, art_fit=display.get('art_fit', 'scale'))
+        self.ascii_display = ASCIIDisplay(self.game_dir, self.pacing, self.renderer)
+        self.safety_system = SafetySystem(self.config.get('ollama_endpoint'))
+
+        if mock_ai_latency is not None:
+            self.ai_analyzer = MockCommandAnalyzer(latency=mock_ai_latency)
+        else:
+            self.ai_analyzer = AICommandAnalyzer(
+                self.config.get('ollama_endpoint', "http://localhost:11434"),
+                pool_size=self.config.get('ai_pool_size', 10)
+            )
+
+        # One scheduler caps how hard the whole class can hit the model
+        self.ai_analyzer.scheduler = AIRequestScheduler(
+            self.config.get('ai_scheduler', {}).get('max_concurrency', 2)
+        )
+
+        # One event log for every session (sandboxes may be deleted when sessions end)
+        self.event_log = EventLog.from_config(self.config, Path.home())
+
+
+class ThreadLocalStream:
+    """
+    Stand-in for sys.stdin/sys.stdout that routes to the calling session's socket
+
+    Threads without a bound stream (the server itself) use the original one.
+    """
+
+    def __init__(self, default):
+        self._default = default
+        self._local = threading.local()
+
+    def bind(self, stream):
+        self._local.stream = stream
+
+    def unbind(self):
+        self._local.stream = None
+
+    def _current(self):
+        return getattr(self._local, "stream", None) or self._default
+
+    def write(self, text):
+        return self._current().write(text)
+
+    def readline(self, *args):
+        return self._current().readline(*args)
+
+    def flush(self):
+        return self._current().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._current(), name)
+
+
+class LearnerSessionHandler(socketserver.StreamRequestHandler):
+    """Runs one learner's game on the connection's thread"""
+
+    def handle(self):
+        server = self.server
+        session_id, home_dir = server.open_session()
+        reader = io.TextIOWrapper(self.rfile, encoding="utf-8", errors="replace")
+        writer = io.TextIOWrapper(self.wfile, encoding="utf-8", errors="replace", write_through=True)
+
+        server.stdin_proxy.bind(reader)
+        server.stdout_proxy.bind(writer)
+        game = None
+        try:
+            game = TerminalQuest(shared=server.shared, home_dir=home_dir, session_id=session_id)
+            if server.mode == "safe":
+                game.setup_game_environment()
+                game.safe_terminal_mode()
+            else:
+                game.game_loop()
+        except SystemExit:
+            pass
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            if game is not None:
+                # Kept sandboxes can be resumed later
+                game.progress.close()
+            server.stdin_proxy.unbind()
+            server.stdout_proxy.unbind()
+            server.close_session(session_id, home_dir)
+
+
+class SessionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, shared: SharedResources, base_dir: Path,
+                 mode: str = "tutorial", keep_sandboxes: bool = False, pool: Optional[SandboxPool] = None):
+        self.socket_path = Path(socket_path)
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+        self.shared = shared
+        self.base_dir = Path(base_dir)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.mode = mode
+        self.keep_sandboxes = keep_sandboxes
+        # Pre-warmed homes on tmpfs; without one, homes are made under base_dir on connect
+        self.pool = pool
+
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.next_session_id = 1
+
+        # Each session's safety rules allow only its own home (see TerminalQuest)
+        if self.pool is not None:
+            self.pool.start()
+
+        # Route print()/input() to whichever session's thread is running
+        self.stdin_proxy = ThreadLocalStream(sys.stdin)
+        self.stdout_proxy = ThreadLocalStream(sys.stdout)
+        sys.stdin = self.stdin_proxy
+        sys.stdout = self.stdout_proxy
+
+        super().__init__(str(self.socket_path), LearnerSessionHandler)
+
+    def open_session(self):
+        """Allocate an id and a private home directory with its own sandbox"""
+        with self.sessions_lock:
+            session_id = self.next_session_id
+            self.next_session_id += 1
+
+        if self.pool is not None:
+            home_dir = self.pool.acquire(f"session-{session_id}")
+        else:
+            home_dir = self.base_dir / f"session-{session_id}"
+            number = 1
+            while True:
+                try:
+                    # Never reuse a home kept from an earlier run on the same base directory
+                    home_dir.mkdir(parents=True)
+                    break
+                except FileExistsError:
+                    number += 1
+                    home_dir = self.base_dir / f"session-{session_id}.{number}"
+
+        with self.sessions_lock:
+            self.sessions[session_id] = {"home_dir": home_dir, "started": time.time()}
+        if self.shared.story_engine is not None:
+            # Keep this learner's chapters resident alongside everyone else's
+            self.shared.story_engine.add_reader()
+        return session_id, home_dir
+
+    def close_session(self, session_id: int, home_dir: Path):
+        """Forget a session and remove (or, with a pool, recycle) its sandbox"""
+        with self.sessions_lock:
+            self.sessions.pop(session_id, None)
+        if self.shared.story_engine is not None:
+            self.shared.story_engine.remove_reader()
+        if self.keep_sandboxes:
+            return
+        if self.pool is not None:
+            self.pool.release(home_dir)
+        else:
+            shutil.rmtree(home_dir, ignore_errors=True)
+
+    def server_close(self):
+        super().server_close()
+        if self.pool is not None:
+            self.pool.close()
+        sys.stdin = self.stdin_proxy._default
+        sys.stdout = self.stdout_proxy._default
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+
+def serve(socket_path: Path = DEFAULT_SOCKET, base_dir: Optional[Path] = None, mode: str = "tutorial",
+          mock_ai_latency: Optional[float] = None, keep_sandboxes: bool = False, pool_size: Optional[int] = None):
+    """
+    Run the session server until interrupted
+
+    Args:
+        pool_size: Pre-warmed sandboxes to keep (overrides config.json's sandbox_pool; 0 turns the pool off)
+    """
+    base_dir = Path(base_dir) if base_dir else Path(tempfile.mkdtemp(prefix="terminal_quest_sessions-"))
+    shared = SharedResources(mock_ai_latency=mock_ai_latency)
+    if pool_size is not None:
+        shared.config['sandbox_pool'] = dict(shared.config.get('sandbox_pool', {}), enabled=pool_size > 0,
+                                             size=pool_size)
+    pool = SandboxPool.from_config(shared.config, shared.game_dir)
+    server = SessionServer(socket_path, shared, base_dir, mode=mode, keep_sandboxes=keep_sandboxes, pool=pool)
+
+    print(f"[SERVER] Hosting Terminal Quest sessions on {socket_path}")
+    if pool is not None:
+        print(f"[SERVER] Keeping {pool.size} sandboxes ready under {pool.root}"
+              + (f", exporting finished ones to {pool.export_dir}" if pool.export_dir else ""))
+    else:
+        print(f"[SERVER] Learner sandboxes live under {base_dir}")
+    # One set of metrics files covering every session
+    exporter = MetricsExporter.from_config(REGISTRY, shared.config)
+    if exporter is not None:
+        exporter.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[SERVER] Shutting down")
+    finally:
+        server.server_close()
+        if exporter is not None:
+            exporter.stop()
+        if shared.event_log is not None:
+            shared.event_log.close()
+
+
+def connect(socket_path: Path = DEFAULT_SOCKET):
+    """Minimal interactive client: copy the terminal to and from the socket"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(str(socket_path))
+
+    def pump_output():
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                break
+            sys.stdout.buffer.write(data)
+            sys.stdout.flush()
+        os._exit(0)
+
+    threading.Thread(target=pump_output, daemon=True).start()
+    try:
+        for line in sys.stdin:
+            sock.sendall(line.encode())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+
+
+# ----------------------------------------------------------------------
+# Load generator
+# ----------------------------------------------------------------------
+
+# Safe mode trusts plain taught commands, so the pipe is what reaches the AI
+SAFE_SCRIPT = ["pwd", "ls", "cd documents", "cat notes.txt", "cd ..", "ls | wc -l", "wc -l welcome.txt", "pwd"]
+
+
+def story_commands(engine) -> List[str]:
+    """The commands the story waits for, in order (the tutorial's script)"""
+    commands = []
+    for position in range(len(engine)):
+        section = engine.section_at(position)
+        if section.waits_for_command:
+            commands.append(section.expected_command)
+    return commands
+
+
+class SimulatedLearner(threading.Thread):
+    """Connects, answers 'press any key' pauses and times each command to the next prompt"""
+
+    def __init__(self, socket_path: Path, script: List[str], think_time: float = 0.0, answer_pauses: bool = True):
+        """
+        Args:
+            answer_pauses: Press Enter at 'press any key' (off when the server's pacing is
+                headless and doesn't wait, or the extra Enters would be read as commands)
+        """
+        super().__init__(daemon=True)
+        self.socket_path = socket_path
+        self.script = script
+        self.think_time = think_time
+        self.answer_pauses = answer_pauses
+        self.latencies = []
+        # Connecting to the first prompt (includes building the learner's sandbox)
+        self.setup_time = None
+        self.error = None
+
+    def _read_until_prompt(self, sock, pending: bytes) -> bytes:
+        """Read until a '$ ' prompt, pressing Enter through story pauses"""
+        while True:
+            if pending.rstrip(b" ").endswith(b"]$"):
+                return b""
+            if b"Press any key" in pending:
+                if self.answer_pauses:
+                    sock.sendall(b"\n")
+                pending = pending.split(b"Press any key", 1)[1]
+            data = sock.recv(65536)
+            if not data:
+                raise ConnectionError("session closed before the prompt")
+            pending += data
+            # Only the tail matters for prompt detection
+            pending = pending[-256:]
+
+    def run(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            start = time.perf_counter()
+            sock.connect(str(self.socket_path))
+            self._read_until_prompt(sock, b"")
+            self.setup_time = time.perf_counter() - start
+            for command in self.script:
+                if self.think_time:
+                    time.sleep(self.think_time)
+                start = time.perf_counter()
+                sock.sendall(command.encode() + b"\n")
+                self._read_until_prompt(sock, b"")
+                self.latencies.append(time.perf_counter() - start)
+            sock.sendall(b"exit\n")
+        except (OSError, ConnectionError) as e:
+            self.error = str(e)
+        finally:
+            sock.close()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def load_test(session_counts: List[int], mode: str = "tutorial", script: Optional[List[str]] = None,
+              mock_ai_latency: float = 0.05, think_time: float = 0.0, ai_concurrency: Optional[int] = None,
+              pool_size: int = 0) -> List[Dict[str, float]]:
+    """
+    Start an in-process server and drive N simulated learners for each N
+
+    Args:
+        mode: "tutorial" (every command goes to the AI) or "safe" (taught commands skip it)
+        script: Commands each learner types (default: the story's commands in the
+            tutorial, SAFE_SCRIPT in safe mode)
+        pool_size: Pre-warmed sandboxes to keep (0: build each one on connect)
+
+    Returns:
+        list: One row of latency statistics (seconds) per session count
+    """
+    work_dir = Path(tempfile.mkdtemp(prefix="terminal_quest_load-"))
+    socket_path = work_dir / "server.sock"
+    shared = SharedResources(mock_ai_latency=mock_ai_latency)
+    # The story's reading pauses would swamp the latencies being measured
+    shared.pacing.headless = True
+    if script is None:
+        script = story_commands(shared.story_engine) if mode == "tutorial" else SAFE_SCRIPT
+    if ai_concurrency:
+        # Nothing has been submitted yet, so no workers are running
+        shared.ai_analyzer.scheduler = AIRequestScheduler(ai_concurrency)
+    pool = SandboxPool(work_dir / "pool", pool_size, shared.game_dir) if pool_size else None
+    server = SessionServer(socket_path, shared, work_dir / "sessions", mode=mode, pool=pool)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+
+    results = []
+    try:
+        for count in session_counts:
+            # Start every N from a cold verdict cache and fresh scheduler stats
+            shared.ai_analyzer.verdict_cache.clear()
+            shared.ai_analyzer.scheduler.reset_stats()
+
+            learners = [SimulatedLearner(socket_path, script, think_time, answer_pauses=False)
+                        for _ in range(count)]
+            start = time.perf_counter()
+            for learner in learners:
+                learner.start()
+            for learner in learners:
+                learner.join()
+            elapsed = time.perf_counter() - start
+
+            ai_stats = shared.ai_analyzer.scheduler.get_stats()
+            latencies = [value for learner in learners for value in learner.latencies]
+            setups = [learner.setup_time for learner in learners if learner.setup_time is not None]
+            errors = sum(1 for learner in learners if learner.error)
+            row = {
+                "sessions": count,
+                "commands": len(latencies),
+                "errors": errors,
+                "p50": statistics.median(latencies) if latencies else 0.0,
+                "p95": percentile(latencies, 95) if latencies else 0.0,
+                "max": max(latencies) if latencies else 0.0,
+                "throughput": len(latencies) / elapsed if elapsed else 0.0,
+                "ai_wait_p95": ai_stats["wait_p95"],
+                "ai_coalesced": ai_stats["coalesced"],
+                "setup_p95": percentile(setups, 95) if setups else 0.0
+            }
+            results.append(row)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shared.ai_analyzer.scheduler.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+def print_load_report(results: List[Dict[str, float]]):
+    print(f"{'sessions':>8} {'commands':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'cmd/s':>8} "
+          f"{'AI wait p95':>12} {'merged':>7} {'setup p95':>10}")
+    for row in results:
+        print(f"{row['sessions']:>8} {row['commands']:>9} {row['errors']:>7} "
+              f"{row['p50'] * 1000:>9.1f} {row['p95'] * 1000:>9.1f} {row['max'] * 1000:>9.1f} "
+              f"{row['throughput']:>8.1f} {row['ai_wait_p95'] * 1000:>10.1f}ms {row['ai_coalesced']:>7} "
+              f"{row['setup_p95'] * 1000:>8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Terminal Quest: Remastered - multi-learner session server')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Host learner sessions on a Unix socket')
+    serve_parser.add_argument('--socket', type=Path, default=DEFAULT_SOCKET, help='Socket path')
+    serve_parser.add_argument('--base-dir', type=Path, help='Directory for per-session sandboxes')
+    serve_parser.add_argument('--mode', choices=['tutorial', 'safe'], default='tutorial', help='Game mode for new sessions')
+    serve_parser.add_argument('--mock-ai', type=float, metavar='SECONDS', help='Use the mock AI backend with this latency')
+    serve_parser.add_argument('--keep-sandboxes', action='store_true', help="Don't delete sandboxes when sessions end")
+    serve_parser.add_argument('--pool', type=int, metavar='N', help='Keep N sandboxes ready on tmpfs (0: off)')
+
+    connect_parser = subparsers.add_parser('connect', help='Join a running server as a learner')
+    connect_parser.add_argument('--socket', type=Path, default=DEFAULT_SOCKET, help='Socket path')
+
+    load_parser = subparsers.add_parser('load-test', help='Simulate N learners and report latency')
+    load_parser.add_argument('--sessions', default='1,2,4,8,16', help='Comma-separated session counts')
+    load_parser.add_argument('--mode', choices=['tutorial', 'safe'], default='tutorial', help='Game mode for the learners')
+    load_parser.add_argument('--script', type=Path, metavar='FILE',
+                             help="Commands to type, one per line (default: the story's, or a safe-mode script)")
+    load_parser.add_argument('--ai-latency', type=float, default=0.05, help='Mock AI latency in seconds')
+    load_parser.add_argument('--think-time', type=float, default=0.0, help='Pause between commands in seconds')
+    load_parser.add_argument('--ai-concurrency', type=int, help='Override the AI scheduler concurrency cap')
+    load_parser.add_argument('--pool', type=int, default=0, metavar='N', help='Keep N sandboxes ready (default: off)')
+
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.socket, args.base_dir, args.mode, args.mock_ai, args.keep_sandboxes, args.pool)
+    elif args.command == 'connect':
+        connect(args.socket)
+    elif args.command == 'load-test':
+        counts = [int(value) for value in args.sessions.split(',') if value.strip()]
+        script = None
+        if args.script is not None:
+            with open(args.script, 'r') as f:
+                script = [line.strip() for line in f if line.strip()]
+        print_load_report(load_test(counts, mode=args.mode, script=script, mock_ai_latency=args.ai_latency, think_time=args.think_time,
+                                    ai_concurrency=args.ai_concurrency, pool_size=args.pool))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Startup Profile for Terminal Quest: Remastered
+Records how long each subsystem takes to import and construct, and how long
+the game takes to reach its first prompt
+"""
+
+import importlib
+import time
+from typing import Any, Dict, List, Optional
+
+
+class StartupProfile:
+    def __init__(self, started: Optional[float] = None):
+        """
+        Args:
+            started: perf_counter() value to measure from (defaults to now)
+        """
+        self.started = time.perf_counter() if started is None else started
+        self.entries = []
+        self.marks = {}
+
+    def load(self, module_name: str, class_name: str, *args, **kwargs) -> Any:
+        """
+        Import a subsystem's module and build it, timing each step
+
+        The import time covers whatever the module pulls in that wasn't
+        loaded yet, i.e. the real cost of first use.
+        """
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        imported = time.perf_counter()
+        instance = getattr(module, class_name)(*args, **kwargs)
+        done = time.perf_counter()
+
+        self.entries.append({
+            "module": module_name,
+            "import": imported - start,
+            "construct": done - imported,
+            "at": done - self.started
+        })
+        return instance
+
+    def mark(self, name: str):
+        """Note the time a milestone (e.g. "first_prompt") was reached, once"""
+        self.marks.setdefault(name, time.perf_counter() - self.started)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-module timings (seconds) and milestones, in load order"""
+        return {"modules": [dict(entry) for entry in self.entries], "marks": dict(self.marks)}
+
+    def format_report(self) -> List[str]:
+        lines = [f"{'module':<16}{'import ms':>11}{'build ms':>11}{'at ms':>10}"]
+        first_prompt = self.marks.get("first_prompt")
+        for entry in self.entries:
+            deferred = first_prompt is not None and entry["at"] > first_prompt
+            lines.append(f"{entry['module']:<16}{entry['import'] * 1000:>11.1f}{entry['construct'] * 1000:>11.1f}"
+                         f"{entry['at'] * 1000:>10.1f}" + ("  (first command)" if deferred else ""))
+        for name, at in self.marks.items():
+            lines.append(f"{name.replace('_', ' ')}: {at * 1000:.1f}ms")
+        return lines
@@ -0,0 +1,215 @@
+"""
+Story Engine for Terminal Quest: Remastered
+Compiles story_content.json into a flat, indexed list of sections so the
+narrative can be driven by data instead of hard-coded methods
+"""
+
+import re
+import string
+from typing import Any, Dict, List, Optional, Tuple
+
+# Longest output line kept for matching; the rest of a longer line is ignored
+MAX_MATCH_LINE = 8192
+
+
+def canonical_command(command: str) -> str:
+    """Normalize a command line for trigger lookups (collapse whitespace)"""
+    return " ".join(command.split())
+
+
+class OutputTrigger:
+    """
+    A reaction to what a command printed, declared in a section's "output_triggers"
+    
+    Either a regex whose named groups become fields:
+        {"pattern": "^Mem:\\s+(?P<total>\\S+)", "response": "You have {total}!"}
+    or field extractors that take a whitespace-separated column (1-based)
+    from the first line matching a regex:
+        {"extract": {"total": {"line": "^Mem:", "column": 2}}, "response": "..."}
+    
+    Patterns are matched line by line. With "advance": true, a match
+    completes the lesson even if the command wasn't the expected one.
+    """
+
+    __slots__ = ("pattern", "extractors", "response", "advance")
+
+    def __init__(self, spec: Dict[str, Any], where: str):
+        if not isinstance(spec, dict) or ("pattern" in spec) == ("extract" in spec):
+            raise ValueError(f"{where}: an output trigger needs exactly one of 'pattern' or 'extract'")
+        try:
+            self.pattern = re.compile(spec["pattern"]) if "pattern" in spec else None
+            self.extractors = tuple(
+                (name, re.compile(rule["line"]), int(rule.get("column", 0)))
+                for name, rule in spec.get("extract", {}).items()
+            )
+        except (re.error, KeyError, TypeError, ValueError, AttributeError) as e:
+            raise ValueError(f"{where}: invalid output trigger ({e})")
+        self.response = spec.get("response", "")
+        self.advance = bool(spec.get("advance", False))
+
+        fields = set(self.pattern.groupindex) if self.pattern else {name for name, _, _ in self.extractors}
+        missing = {name for _, name, _, _ in string.Formatter().parse(self.response) if name} - fields
+        if missing:
+            raise ValueError(f"{where}: output trigger response uses unknown fields {sorted(missing)}")
+
+    def render(self, fields: Dict[str, str]) -> str:
+        return self.response.format_map(fields)
+
+
+class OutputWatch:
+    """
+    Incremental matcher for a section's output triggers
+    
+    feed() takes output chunks as they stream in; only the current partial
+    line is buffered, so the output itself never has to be kept.
+    """
+
+    def __init__(self, triggers):
+        self.triggers = triggers
+        self.partial = ""
+        # Per trigger: extracted fields so far, or the final match
+        self.fields = [{} for _ in triggers]
+        self.matched = [False] * len(triggers)
+
+    def feed(self, chunk: str):
+        if all(self.matched):
+            return
+        lines = (self.partial + chunk).split("\n")
+        self.partial = lines.pop()[:MAX_MATCH_LINE]
+        for line in lines:
+            self._match_line(line[:MAX_MATCH_LINE])
+
+    def _match_line(self, line: str):
+        for number, trigger in enumerate(self.triggers):
+            if self.matched[number]:
+                continue
+            fields = self.fields[number]
+            if trigger.pattern is not None:
+                match = trigger.pattern.search(line)
+                if match:
+                    fields.update({name: value or "" for name, value in match.groupdict().items()})
+                    self.matched[number] = True
+                continue
+            for name, line_pattern, column in trigger.extractors:
+                if name in fields or not line_pattern.search(line):
+                    continue
+                columns = line.split()
+                if column <= 0:
+                    fields[name] = line.strip()
+                elif column <= len(columns):
+                    fields[name] = columns[column - 1]
+            self.matched[number] = len(fields) == len(trigger.extractors)
+
+    def finish(self) -> List[Tuple[OutputTrigger, Dict[str, str]]]:
+        """Match the last unterminated line and return the triggers that fired"""
+        if self.partial:
+            self._match_line(self.partial)
+            self.partial = ""
+        return [(trigger, self.fields[number]) for number, trigger in enumerate(self.triggers) if self.matched[number]]
+
+
+class StorySection:
+    """One compiled section of the story"""
+
+    __slots__ = (
+        "index", "chapter", "section_id", "speaker", "text", "paragraphs", "expected_command",
+        "lesson_context", "show_ascii", "clear_after", "press_any_key", "pause_before", "output_triggers"
+    )
+
+    def __init__(self, index: int, chapter: int, section_id: str, data: Dict[str, Any]):
+        self.index = index
+        self.chapter = chapter
+        self.section_id = section_id
+        self.speaker = data.get("speaker")
+        self.text = data.get("text", "")
+        # Pre-split for display, each paragraph spoken by the section's speaker
+        paragraphs = [paragraph.strip() for paragraph in self.text.split("\n\n") if paragraph.strip()]
+        if self.speaker:
+            paragraphs = [f"[{self.speaker}] {paragraph}" for paragraph in paragraphs]
+        self.paragraphs = tuple(paragraphs)
+        expected = data.get("expected_command")
+        self.expected_command = canonical_command(expected) if expected else None
+        self.lesson_context = data.get("lesson_context")
+        self.show_ascii = data.get("show_ascii")
+        self.clear_after = data.get("clear_after", False)
+        self.press_any_key = data.get("press_any_key", False)
+        self.pause_before = data.get("pause_before", 0)
+        self.output_triggers = tuple(
+            OutputTrigger(spec, f"section '{section_id}'") for spec in data.get("output_triggers", [])
+        )
+
+    @property
+    def waits_for_command(self) -> bool:
+        return self.expected_command is not None
+
+    def __repr__(self):
+        return f"<StorySection {self.chapter}/{self.section_id}>"
+
+
+class StoryEngine:
+    """
+    Immutable compiled story: sections in play order plus lookup indexes
+
+    Per-player state (the current position) lives in StoryManager, so one
+    engine can be shared by every session.
+    """
+
+    def __init__(self, story_data: Dict[str, Any]):
+        self.sections: List[StorySection] = []
+        self.chapter_titles: Dict[int, str] = {}
+        self.chapter_starts: Dict[int, int] = {}
+        # (lesson_context, canonical command) -> index of the section to play next
+        self.trigger_index: Dict[Tuple[str, str], int] = {}
+        # lesson_context -> index of the section that sets it
+        self.context_index: Dict[str, int] = {}
+        # (chapter, section_id) -> index
+        self.section_index: Dict[Tuple[int, str], int] = {}
+        self.command_tutorials = story_data.get("command_tutorials", {})
+
+        self._compile(story_data)
+
+    def _compile(self, story_data: Dict[str, Any]):
+        chapters = story_data.get("chapters", {})
+        for chapter_key in sorted(chapters, key=int):
+            chapter = chapters[chapter_key]
+            chapter_number = int(chapter_key)
+            self.chapter_titles[chapter_number] = chapter.get("title", f"Chapter {chapter_number}")
+            self.chapter_starts[chapter_number] = len(self.sections)
+
+            for section_id, data in chapter.get("sections", {}).items():
+                section = StorySection(len(self.sections), chapter_number, section_id, data)
+                self.sections.append(section)
+                self.section_index[(chapter_number, section_id)] = section.index
+
+                if section.lesson_context:
+                    if section.lesson_context in self.context_index:
+                        raise ValueError(f"Duplicate lesson_context '{section.lesson_context}' in chapter {chapter_key}")
+                    self.context_index[section.lesson_context] = section.index
+
+                if section.output_triggers and not section.waits_for_command:
+                    raise ValueError(f"Section '{section_id}' has output triggers but expects no command")
+
+                if section.waits_for_command:
+                    if not section.lesson_context:
+                        raise ValueError(f"Section '{section_id}' expects a command but has no lesson_context")
+                    # Entering the expected command moves on to the following section
+                    self.trigger_index[(section.lesson_context, section.expected_command)] = section.index + 1
+
+    def __len__(self):
+        return len(self.sections)
+
+    def section_at(self, index: int) -> Optional[StorySection]:
+        """Section at a position, or None past the end of the story"""
+        if 0 <= index < len(self.sections):
+            return self.sections[index]
+        return None
+
+    def match_trigger(self, lesson_context: Optional[str], command: str) -> Optional[int]:
+        """O(1) lookup: where does this command take a player in this lesson?"""
+        if not lesson_context:
+            return None
+        return self.trigger_index.get((lesson_context, canonical_command(command)))
+
+    def art_for(self, chapter: int, name: str):
+        """Art carried with a chapter; the in-memory engine carries none (see ContentStore)"""
+        return None